@@ -1,5 +1,7 @@
-from ssi_utils import load_json, w3
+from ssi_utils import load_json, get_contract, w3
 from datetime import datetime
+from audit_batcher import parse_batch_action, load_audit_batch, verify_audit_record, BATCH_SUBJECT
+from audit_index import AuditIndex
 
 def verify_audit_trail():
     print("\n" + "="*60)
@@ -8,46 +10,62 @@ def verify_audit_trail():
     print("="*60)
 
     config = load_json("system_config.json")
-    contract = w3.eth.contract(address=config['contract_address'], abi=config['abi'])
+    contract = get_contract(config['contract_address'])
 
-    # Fetch logs from the smart contract
-    # Assuming your contract has an event 'AuditLog(address indexed user, string action, uint256 timestamp)'
-    # Or we can filter specifically if you have that setup.
-    # For this demo, we will look for the latest blocks.
+    # 'AuditLog' events are kept in a local SQLite index (audit_index.py);
+    # only blocks mined since the last run are fetched from the chain.
+    print("[Forensics] Syncing 'AuditLog' index with the Blockchain...")
     
-    print("[Forensics] Scanning Blockchain for 'AuditLog' events...")
-    
-    # Create filter for the specific event
+    index = AuditIndex(w3, contract)
     try:
-        event_filter = contract.events.AuditLog.create_filter(from_block='earliest')
-        logs = event_filter.get_all_entries()
+        new_events = index.sync()
+        total = index.count()
         
-        if len(logs) == 0:
+        if total == 0:
             print("❌ No logs found. Did the Owner Node finish training?")
             return
 
-        print(f"✅ Found {len(logs)} Immutable Records.\n")
+        print(f"✅ Found {total} Immutable Records ({new_events} new since last scan), "
+              f"{index.batch_count()} more inside anchored batches.\n")
         
-        for i, log in enumerate(logs[-3:]): # Show last 3
-            args = log['args']
-            user = args.get('user') or args.get('did') # Adjust based on your solidity
-            action = args.get('action')
-            timestamp = args.get('timestamp')
-            
-            readable_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        for i, event in enumerate(reversed(index.latest(3))): # Show last 3
+            readable_time = datetime.fromtimestamp(event['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
             
             print(f"   📄 Record #{i+1}:")
-            print(f"      - User:   {user}")
-            print(f"      - Action: {action}")
-            print(f"      - Time:   {readable_time}")
+            print(f"      - Verifier: keccak {event['verifier_hash'][:16]}...") # Indexed string: hash only
+            print(f"      - Action:   {event['action']}")
+            print(f"      - Time:     {readable_time} (block {event['block_number']})")
             print("      ------------------------------------------------")
 
+        # --- BATCHED RECORDS ---
+        # Owner nodes anchor audit events in Merkle batches; every event the
+        # owner kept locally must be provably included under its on-chain root
+        batches = [parse_batch_action(event['action']) for event in index.by_action_prefix(BATCH_SUBJECT + ":")]
+        batches = [anchor for anchor in batches if anchor]
+        if batches:
+            print(f"\n[Forensics] Checking {len(batches)} Anchored Audit Batches...")
+        for root, count in batches:
+            batch = load_audit_batch(root)
+            if batch is None:
+                print(f"   ⚠️ Batch {root[:15]}... ({count} events): local records not found")
+                continue
+
+            valid = sum(1 for record in batch['records'] if verify_audit_record(record, root))
+            status = "✅" if valid == count == len(batch['records']) else "❌"
+            print(f"   {status} Batch {root[:15]}...: {valid}/{count} records proven on chain")
+            for record in batch['records'][-3:]:
+                event = record['event']
+                readable_time = datetime.fromtimestamp(event['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"      - {event['verifier']} -> {event['subject']}: {event['action']} @ {readable_time}")
+
         print("\n[Conclusion] The system provides cryptographically verifiable proof of access.")
 
     except Exception as e:
         print(f"⚠️ Error reading logs: {e}")
         # Fallback if event filter fails (Ganache weirdness)
         print("   (Ensure 'AuditLog' event is defined in your Solidity contract)")
+    finally:
+        index.close()
 
 if __name__ == "__main__":
     verify_audit_trail()
\ No newline at end of file
@@ -116,6 +116,7 @@ def deploy_contract():
     config = {
         "contract_address": tx_receipt.contractAddress,
         "ga_address": w3.eth.accounts[0],
+        "zk_group": "modp", # or "secp256k1" (smaller, faster proofs)
         "abi": contract_interface['abi']
     }
     with open("system_config.json", "w") as f:
@@ -1,15 +1,13 @@
-from ssi_utils import SSIEntity, load_json, save_json, w3
+from ssi_utils import SSIEntity, load_json, save_json, get_contract
 from key_manager import get_ganache_key
-from merkle_utils import MerkleTree
+from merkle_utils import BinaryMerkleTree
 import json
 
 # Load Config
 config = load_json("system_config.json")
 
-# --- FORCE LOAD CONTRACT WITH CORRECT ABI ---
-# We define this locally to ensure we are using the LATEST ABI from system_config.json
-# instead of relying on potentially stale cache in ssi_utils.
-contract = w3.eth.contract(address=config['contract_address'], abi=config['abi'])
+# Shared contract instance (ABI from system_config.json, loaded once per process)
+contract = get_contract(config['contract_address'])
 
 # Setup Keys
 PKEY_RI = get_ganache_key(1)
@@ -48,7 +46,7 @@ vc_string = json.dumps(vc_ri_to_analyst, sort_keys=True)
 valid_vcs = [vc_string, "dummy_data_1", "dummy_data_2"] 
 
 # Build Tree
-mt = MerkleTree(valid_vcs)
+mt = BinaryMerkleTree(valid_vcs)
 root = mt.get_root()
 proof = mt.get_proof(vc_string)
 
@@ -57,15 +55,7 @@ print(f"[HBMT] Merkle Root Generated: {root[:10]}...")
 # 4. PUBLISH ROOT (Using the forced contract instance)
 try:
     print(f"[HBMT] Publishing to Smart Contract at {config['contract_address']}...")
-    tx = contract.functions.publishMerkleRoot(RI.did, root).build_transaction({
-        'from': RI.address,
-        'nonce': w3.eth.get_transaction_count(RI.address),
-        'gas': 3000000,
-        'gasPrice': w3.to_wei('20', 'gwei')
-    })
-    signed_tx = w3.eth.account.sign_transaction(tx, RI.account.key)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    w3.eth.wait_for_transaction_receipt(tx_hash)
+    RI.send_transaction(contract.functions.publishMerkleRoot(RI.did, root)).result()
     print("[HBMT] ✅ Merkle Root Published to Blockchain Ledger.")
 except Exception as e:
     print(f"❌ Error publishing root: {e}")
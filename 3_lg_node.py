@@ -1,7 +1,9 @@
-from ssi_utils import SSIEntity, load_json, save_json, w3
+from ssi_utils import SSIEntity, load_json, save_json, get_contract
 from key_manager import get_ganache_key
-from merkle_utils import MerkleTree
+from merkle_utils import BinaryMerkleTree
+from merkle_store import MerkleStore, HBMT_STORE
 import json
+import os
 
 def run_lg_node():
     # Load Config
@@ -53,30 +55,28 @@ def run_lg_node():
     # --- NOVELTY: GENERATE OWNER MERKLE TREE ---
     print("\n--- [LG] Building Hospital Trust Tree (HBMT) ---")
     
-    # Build Tree from valid VCs
-    mt = MerkleTree(valid_vc_strings)
+    # Build Tree from valid VCs (large allowlists are hashed on all cores)
+    mt = BinaryMerkleTree(valid_vc_strings, workers=os.cpu_count())
     root = mt.get_root()
     
     print(f"[LG] Generated Hospital Root: {root[:15]}...")
-    
+
+    # Publish every level so owners (5_owner_node.py) can take their proof
+    # straight from the tree instead of waiting for a proof file
+    MerkleStore.create(HBMT_STORE, mt).close()
+    print(f"[LG] 💾 Tree saved to {HBMT_STORE}")
+
     # Publish Root to Blockchain
     print("[LG] 📡 Publishing Root to Blockchain...")
-    contract = w3.eth.contract(address=config['contract_address'], abi=config['abi'])
-    tx = contract.functions.publishMerkleRoot(LG.did, root).build_transaction({
-        'from': LG.address,
-        'nonce': w3.eth.get_transaction_count(LG.address),
-        'gas': 3000000,
-        'gasPrice': w3.to_wei('20', 'gwei')
-    })
-    signed_tx = w3.eth.account.sign_transaction(tx, LG.account.key)
-    w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    contract = get_contract(config['contract_address'])
+    LG.send_transaction(contract.functions.publishMerkleRoot(LG.did, root))
     print("[LG] ✅ Hospital Allowlist is Active on Blockchain.")
 
     # --- ISSUE PROOFS TO OWNERS ---
     # Owners need these proofs to join the Federated Learning rounds
     print("\n--- [LG] Distributing Merkle Proofs to Owners ---")
-    for i, vc_str in enumerate(valid_vc_strings):
-        proof = mt.get_proof(vc_str)
+    all_proofs = mt.get_all_proofs() # One pass over the tree, in leaf order
+    for i, proof in enumerate(all_proofs):
         filename = f"merkle_proof_owner_{i+1}.json"
         save_json(filename, proof)
         print(f"   🎟️  Proof saved for Owner {i+1}")
@@ -1,22 +1,165 @@
 import time
 import glob
-import torch
 import json
 import sys
-from ssi_utils import SSIEntity, load_json, w3  
+import queue
+import threading
+from ssi_utils import SSIEntity, load_json, get_contract, warm_chain_caches, w3  
 from key_manager import get_ganache_key
 from cloud_client import CloudAgentClient
-from merkle_utils import verify_merkle_proof
+from merkle_utils import verify_merkle_proof, verify_merkle_multiproof, merge_proofs
+from sparse_merkle import verify_not_revoked, revocation_anchor
+from chain_cache import get_root_cache
+from tensor_codec import decode_weights
+from delivery import PENDING, REACHED
 
-# Global list to store incoming model updates
-incoming_replies = []
+# Incoming model updates, verified and aggregated as they arrive
+update_queue = queue.Queue()
+replies_received = 0
+replied_dids = set()
 
 def on_reply_received(msg):
     """Callback: Triggered when M2 (Model Update) arrives from Cloud"""
+    global replies_received
     if msg.get('type') == 'M2':
         sender = msg['from']
         print(f"\n   📩 [Cloud] Received M2 (Model Update) from {sender}")
-        incoming_replies.append(msg['payload'])
+        replies_received += 1
+        replied_dids.add(sender)
+        update_queue.put(msg['payload'])
+
+def verify_replies_merkle(replies, config):
+    """
+    Merkle check for every reply. Replies under the same issuer root are
+    merged into one multiproof, so shared upper-level nodes are hashed once
+    and the root is fetched once per issuer. If a batch fails, each reply in
+    it is re-checked on its own to find the offender. A reply also needs a
+    non-revocation proof once its issuer has revoked anyone.
+    """
+    results = [False] * len(replies)
+    by_issuer = {}
+    for i, reply in enumerate(replies):
+        try:
+            by_issuer.setdefault(reply['vc']['payload']['issuer'], []).append(i)
+        except Exception as e:
+            print(f"   ⚠️ Merkle Check Error: {e}")
+
+    roots = get_root_cache(w3, get_contract(config['contract_address']))
+    for issuer_did, members in by_issuer.items():
+        try:
+            blockchain_root = roots.get(issuer_did)
+        except Exception as e:
+            print(f"   ⚠️ Merkle Check Error: {e}")
+            continue
+        if not blockchain_root:
+            print(f"   ⚠️ No Root found for issuer {issuer_did}")
+            continue
+
+        members = [i for i in members if replies[i].get('merkle_proof')]
+        vc_strings = [json.dumps(replies[i]['vc'], sort_keys=True) for i in members]
+        multiproof = merge_proofs([replies[i]['merkle_proof'] for i in members])
+
+        if multiproof and verify_merkle_multiproof(vc_strings, multiproof, blockchain_root):
+            for i in members:
+                results[i] = True
+        else:
+            # One malformed proof must not take the rest of the group down with it
+            for i, vc_string in zip(members, vc_strings):
+                try:
+                    results[i] = verify_merkle_proof(vc_string, replies[i]['merkle_proof'], blockchain_root)
+                except Exception as e:
+                    print(f"   ⚠️ Merkle Check Error: {e}")
+                    results[i] = False
+
+        # Fails closed: a reply whose revocation status cannot be checked is rejected
+        try:
+            revoked_root = roots.get(revocation_anchor(issuer_did))
+        except Exception as e:
+            print(f"   ⚠️ Revocation Check Error: {e}")
+            for i in members:
+                results[i] = False
+            continue
+        for i in members:
+            if not results[i]:
+                continue
+            try:
+                holder_did = replies[i]['vc']['payload']['credentialSubject']['id']
+                if not verify_not_revoked(holder_did, replies[i].get('revocation_proof'), revoked_root):
+                    print(f"   ⛔ {holder_did} is on the revocation registry")
+                    results[i] = False
+            except Exception as e:
+                print(f"   ⚠️ Revocation Check Error: {e}")
+                results[i] = False
+
+    return results
+
+def verify_and_fold(Analyst, config, replies, aggregator):
+    """Verifies a batch of replies and folds the valid ones into 'aggregator'"""
+    # One batched RPC for every key and root these replies need
+    issuers = []
+    for reply in replies:
+        try:
+            issuer_did = reply['vc']['payload']['issuer']
+            issuers += [issuer_did, revocation_anchor(issuer_did)]
+        except (KeyError, TypeError):
+            pass
+    try:
+        warm_chain_caches(get_contract(config['contract_address']),
+                          [reply.get('sender_address') for reply in replies], issuers)
+    except Exception as e:
+        print(f"   ⚠️ Batched prefetch failed, falling back to single reads: {e}")
+
+    merkle_results = verify_replies_merkle(replies, config)
+    zk_results = Analyst.verify_zk_batch([
+        (reply.get('sender_address'), reply.get('challenge_context'), reply.get('proof_nizkp'))
+        for reply in replies
+    ])
+
+    for i, reply in enumerate(replies):
+        sender_did = reply.get('sender_did')
+        
+        try:
+            # 1. Standard Checks (ZK verified in batch above + VC)
+            is_zk = zk_results[i]
+            is_vc = Analyst.verify_vc_issuer(reply['vc'])
+            
+            # 2. Merkle Check (LG Root, verified in batch above)
+            is_merkle_valid = merkle_results[i]
+
+            # 3. Aggregation Logic (weighted sum, updated in place)
+            if is_zk and is_vc and is_merkle_valid:
+                print(f"   ✅ Verified Model from {sender_did} (Identity + Merkle)")
+                aggregator.add(decode_weights(reply['weights']), reply['meta']['data_rows'])
+            else:
+                print(f"   ❌ Rejected update from {sender_did} (Security Check Failed)")
+
+        except Exception as e:
+            print(f"   ❌ Error verifying {sender_did}: {e}")
+
+def aggregation_worker(Analyst, config, aggregator):
+    """
+    Runs while the analyst waits: whatever has queued up since the last pass
+    is verified as one batch and folded in, then the payloads are dropped.
+    A None in the queue stops the worker.
+    """
+    while True:
+        replies = [update_queue.get()]
+        while True:
+            try:
+                replies.append(update_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        stop = None in replies
+        replies = [reply for reply in replies if reply is not None]
+        if replies:
+            try:
+                verify_and_fold(Analyst, config, replies, aggregator)
+            except Exception as e:
+                print(f"   ❌ Aggregation Error: {e}")
+        del replies # Raw weights are no longer needed
+        if stop:
+            return
 
 def run_persistent_analyst():
     # --- SETUP IDENTITY ---
@@ -76,46 +219,71 @@ def run_persistent_analyst():
         "merkle_proof": merkle_proof
     }
     
-    sent_count = 0
+    target_dids = []
     for filename in owner_files:
         try:
             owner_data = load_json(filename)
             vc_payload = owner_data.get('payload', {})
             if 'credentialSubject' in vc_payload:
-                target_did = vc_payload['credentialSubject']['id']
+                target_dids.append(vc_payload['credentialSubject']['id'])
             elif 'holder' in vc_payload:
-                target_did = vc_payload['holder']
+                target_dids.append(vc_payload['holder'])
             else:
                 raise ValueError(f"Could not find DID in {filename}")
-
-            print(f"   📡 Sending Request to {target_did}...")
-            cloud.send(target_did, "M1", payload)
-            sent_count += 1
         except Exception as e:
             print(f"   ⚠️ Failed to load {filename}: {e}")
 
+    # One upload for every owner; the relay fans it out
+    print(f"   📡 Broadcasting Request to {len(target_dids)} Owners...")
+    m1_ids = [msg_id for msg_id in cloud.broadcast(target_dids, "M1", payload).values() if msg_id]
+    sent_count = len(m1_ids)
+
     if sent_count == 0:
         print("❌ No requests sent. Exiting.")
         return
 
     print(f"\n--- [Analyst] Phase 2: Waiting for {sent_count} Replies ---")
+    from fl_utils import StreamingFedAvg # Pulls in torch; only needed from here on
+    
+    # Updates are verified and aggregated while we wait (Phase 3 overlaps Phase 2)
+    aggregator = StreamingFedAvg()
+    worker = threading.Thread(target=aggregation_worker, args=(Analyst, config, aggregator))
+    worker.daemon = True
+    worker.start()
     
     start_time = time.time()
-    TIMEOUT_SECONDS = 150  # Stop waiting after 60 seconds
+    TIMEOUT_SECONDS = 150  # Stop waiting after 150 seconds
     
     while True:
-        count = len(incoming_replies)
+        count = replies_received
         elapsed = int(time.time() - start_time)
         remaining = TIMEOUT_SECONDS - elapsed
         
-        print(f"\r   > Status: Received {count}/{sent_count} | Timeout in {remaining}s...", end="")
+        # Relay receipts for M1: owners it dropped or let expire will not
+        # reply, so there is no point waiting for them. A stored M1 is still
+        # pending: the owner gets it if it reconnects before the timeout
+        delivery = cloud.delivery.summary(m1_ids)
+        reached = [did for did, status in delivery.items() if status in REACHED]
+        pending = [did for did, status in delivery.items() if status in PENDING]
+        unreachable = len(delivery) - len(reached) - len(pending)
+        
+        print(f"\r   > Status: Received {count}/{sent_count} | Unreachable {unreachable} | Timeout in {remaining}s...", end="")
         
         # Condition 1: All received
         if count >= sent_count:
             print("\n   ✅ All targeted owners have replied! Starting Aggregation...")
             break
         
-        # Condition 2: Timeout reached (Partial Aggregation)
+        # Condition 2: Every owner the relay reached has replied. A relay
+        # without receipts leaves everything 'sent', so we fall through to the timeout
+        if len(delivery) == sent_count and not pending and replied_dids.issuperset(reached):
+            if count == 0:
+                print("\n   ❌ No owner could be reached. Aborting.")
+                return
+            print(f"\n   ✅ All reachable owners have replied ({unreachable} unreachable). Starting Aggregation...")
+            break
+        
+        # Condition 3: Timeout reached (Partial Aggregation)
         if elapsed >= TIMEOUT_SECONDS:
             print(f"\n   ⚠️ Timeout Reached! Proceeding with {count}/{sent_count} updates.")
             if count == 0:
@@ -127,69 +295,17 @@ def run_persistent_analyst():
 
     # --- PHASE 3: AGGREGATION ---
     print("\n--- [Analyst] Phase 3: Global Aggregation (FedAvg) ---")
+    import torch # Only needed once replies are in
     
-    global_weights = None
-    total_samples = 0
-    valid_updates = 0
-    for reply in incoming_replies:
-        sender_did = reply['sender_did']
-        
-        try:
-            # 1. Standard Checks (ZK + VC)
-            is_zk = Analyst.verify_zk_proof(reply['sender_address'], reply['challenge_context'], reply['proof_nizkp'])
-            is_vc = Analyst.verify_vc_issuer(reply['vc'])
-            
-            # 2. Merkle Check (LG Root)
-            is_merkle_valid = False
-            try:
-                vc_string = json.dumps(reply['vc'], sort_keys=True)
-                proof = reply.get('merkle_proof')
-                issuer_did = reply['vc']['payload']['issuer'] 
-                contract = w3.eth.contract(address=config['contract_address'], abi=config['abi'])
-                blockchain_root = contract.functions.getMerkleRoot(issuer_did).call()
-                
-                if blockchain_root and proof:
-                    is_merkle_valid = verify_merkle_proof(vc_string, proof, blockchain_root)
-                elif not blockchain_root:
-                    print(f"   ⚠️ No Root found for issuer {issuer_did}")
-            except Exception as e:
-                print(f"   ⚠️ Merkle Check Error: {e}")
-
-            # 3. Aggregation Logic
-            if is_zk and is_vc and is_merkle_valid:
-                print(f"   ✅ Verified Model from {sender_did} (Identity + Merkle)")
-                
-                # --- THIS WAS LIKELY MISSING BEFORE ---
-                # Convert list back to tensor
-                local_weights = {k: torch.tensor(v) for k, v in reply['weights'].items()}
-                num_samples = reply['meta']['data_rows']
-                
-                if global_weights is None:
-                    # Initialize global weights with the first valid model
-                    global_weights = {k: v * num_samples for k, v in local_weights.items()}
-                else:
-                    # Aggregate (Weighted Sum)
-                    for k in global_weights.keys():
-                        global_weights[k] += local_weights[k] * num_samples
-                
-                total_samples += num_samples
-                valid_updates += 1
-                # --------------------------------------
-                
-            else:
-                print(f"   ❌ Rejected update from {sender_did} (Security Check Failed)")
-
-        except Exception as e:
-            print(f"   ❌ Error verifying {sender_did}: {e}")
+    # Finish whatever is still queued
+    update_queue.put(None)
+    worker.join()
     
     # Finalize
-    if global_weights and total_samples > 0:
-        # Calculate Average
-        for k in global_weights.keys():
-            global_weights[k] = global_weights[k] / total_samples
-            
+    global_weights = aggregator.result()
+    if global_weights:
         torch.save(global_weights, "global_model_final.pth")
-        print(f"\n✅ [SUCCESS] Global Model Aggregated from {valid_updates} Owners.")
+        print(f"\n✅ [SUCCESS] Global Model Aggregated from {aggregator.updates} Owners.")
         print("💾 Saved to: global_model_final.pth")
     else:
         print("❌ Aggregation Failed (No valid models accumulated).")
@@ -1,15 +1,16 @@
 import sys
 import os
-import torch
-import torch.nn as nn
-import pandas as pd
 import time
 import json
 from ssi_utils import SSIEntity, load_json, get_contract, w3 
 from key_manager import get_ganache_key
-from fl_utils import HybridDL, preprocess_data, apply_ldp
 from cloud_client import CloudAgentClient
 from merkle_utils import verify_merkle_proof
+from sparse_merkle import verify_not_revoked, load_revocation_proof, revocation_anchor
+from merkle_store import load_membership_proof
+from chain_cache import get_root_cache
+from audit_batcher import AuditBatcher
+from tensor_codec import encode_weights
 
 # Global queue for incoming requests
 incoming_requests = []
@@ -20,6 +21,18 @@ def on_request_received(msg):
         print(f"\n[Cloud] 📩 Received Request (M1) from {msg['from']}")
         incoming_requests.append(msg)
 
+def load_my_merkle_proof(my_vc, owner_index):
+    """
+    My allowlist proof: served from the LG's published tree (always the
+    current one), else the proof file the LG handed out.
+    """
+    proof = load_membership_proof(json.dumps(my_vc, sort_keys=True))
+    if proof is None:
+        my_proof_file = f"merkle_proof_owner_{owner_index}.json"
+        if os.path.exists(my_proof_file):
+            proof = load_json(my_proof_file)
+    return proof
+
 def run_owner_node(owner_index):
     # --- SETUP ---
     config = load_json("system_config.json")
@@ -52,6 +65,8 @@ def run_owner_node(owner_index):
 
     print(f"[{owner_name}] Listening for Training Requests...")
     contract = get_contract(config['contract_address']) # Load Contract Instance
+    roots = get_root_cache(w3, contract) # Issuer roots, refreshed on publishMerkleRoot
+    audit = AuditBatcher(Owner, contract) # Audit events are anchored in Merkle batches
 
     # --- MAIN LOOP ---
     while True:
@@ -93,7 +108,7 @@ def run_owner_node(owner_index):
                     vc_string = json.dumps(req['vc'], sort_keys=True)
                     proof = req.get('merkle_proof')
                     if proof:
-                        blockchain_root = contract.functions.getMerkleRoot(issuer_did).call()
+                        blockchain_root = roots.get(issuer_did)
                         if blockchain_root:
                             is_merkle_valid = verify_merkle_proof(vc_string, proof, blockchain_root)
                 except:
@@ -108,17 +123,22 @@ def run_owner_node(owner_index):
                     print(f"[{owner_name}] 🛡️ Performing Self-Diagnostic on License...")
                     try:
                         # 1. Load my own proof
-                        my_proof_file = f"merkle_proof_owner_{owner_index}.json"
-                        if os.path.exists(my_proof_file):
-                            my_proof = load_json(my_proof_file)
+                        my_proof = load_my_merkle_proof(my_vc, owner_index)
+                        if my_proof is not None:
                             
                             # 2. Get the *LIVE* Root from Blockchain (LG's Root)
                             my_issuer_did = my_vc['payload']['issuer']
-                            live_root = contract.functions.getMerkleRoot(my_issuer_did).call()
+                            live_root = roots.get(my_issuer_did)
                             
                             # 3. Verify myself
                             my_vc_string = json.dumps(my_vc, sort_keys=True)
                             am_i_valid = verify_merkle_proof(my_vc_string, my_proof, live_root)
+
+                            # 4. Check the LG's revocation registry (sparse Merkle tree)
+                            revoked_root = roots.get(revocation_anchor(my_issuer_did))
+                            my_revocation_proof = load_revocation_proof(Owner.did)
+                            if not verify_not_revoked(Owner.did, my_revocation_proof, revoked_root):
+                                am_i_valid = False
                             
                             if not am_i_valid:
                                 print("\n" + "!"*60)
@@ -140,21 +160,21 @@ def run_owner_node(owner_index):
                     # --- STEP C: AUDIT LOG ---
                     print(f"[{owner_name}] 📝 Logging to KAC Audit System...")
                     try:
-                        tx = contract.functions.logAudit(Owner.did, sender_did, "TRAINING_AUTH_SUCCESS").build_transaction({
-                            'from': Owner.address,
-                            'nonce': w3.eth.get_transaction_count(Owner.address),
-                            'gas': 3000000,
-                            'gasPrice': w3.to_wei('20', 'gwei')
-                        })
-                        signed_tx = w3.eth.account.sign_transaction(tx, Owner.account.key)
-                        w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-                        print(f"[{owner_name}] ✅ Audit Logged on Blockchain.")
+                        # Buffered; the batch root goes on chain with one logAudit
+                        audit.record(sender_did, "TRAINING_AUTH_SUCCESS")
+                        print(f"[{owner_name}] ✅ Audit Event Recorded (anchored with the next batch).")
                     except:
                         pass
 
                     # --- STEP D: LOCAL TRAINING ---
                     print(f"[{owner_name}] Starting Local Training...")
                     try:
+                        # Heavy ML stack is only loaded once a training job is accepted
+                        import torch
+                        import torch.nn as nn
+                        import pandas as pd
+                        from fl_utils import HybridDL, preprocess_data, apply_ldp
+
                         raw_df = pd.read_csv(dataset_file)
                         X_proc, y_proc = preprocess_data(raw_df)
                         X_priv = apply_ldp(X_proc, epsilon=2.0)
@@ -178,11 +198,13 @@ def run_owner_node(owner_index):
                         print(f"[{owner_name}] Training Done (Loss: {loss.item():.4f}). Sending Results...")
 
                         local_weights = model.state_dict()
-                        weights_json = {k: v.tolist() for k, v in local_weights.items()}
+                        # Packed little-endian float32 buffer + manifest (tensor_codec.py)
+                        weights_json = encode_weights(local_weights)
                         
                         reply_ctx = f"FL_ACCEPT_{int(time.time())}"
                         proof_pr_o = Owner.generate_zk_proof(reply_ctx)
-                        my_proof = load_json(my_proof_file) if os.path.exists(my_proof_file) else None
+                        my_proof = load_my_merkle_proof(my_vc, owner_index)
+                        my_revocation_proof = load_revocation_proof(Owner.did)
 
                         reply_payload = {
                             "sender_did": Owner.did,
@@ -192,11 +214,15 @@ def run_owner_node(owner_index):
                             "challenge_context": reply_ctx,
                             "weights": weights_json,
                             "meta": {"data_rows": len(X_priv)},
-                            "merkle_proof": my_proof 
+                            "merkle_proof": my_proof,
+                            "revocation_proof": my_revocation_proof
                         }
 
-                        cloud.send(sender_did, "M2", reply_payload)
-                        print(f"[{owner_name}] 📤 Sent M2 Reply (with Proof) to Analyst.")
+                        # Chunked + acknowledged, so large models survive relay limits and blips
+                        if cloud.send_large(sender_did, "M2", reply_payload):
+                            print(f"[{owner_name}] 📤 Sent M2 Reply (with Proof) to Analyst.")
+                        else:
+                            print(f"[{owner_name}] ❌ M2 Reply to Analyst failed (transfer stalled).")
                         
                     except Exception as e:
                         print(f"❌ Training Error: {e}")
@@ -1,6 +1,8 @@
 import json
-from ssi_utils import SSIEntity, load_json, save_json, w3
-from merkle_utils import MerkleTree
+import os
+import time
+from ssi_utils import SSIEntity, load_json, get_contract
+from sparse_merkle import SparseMerkleTree, revocation_anchor, REVOCATION_REGISTRY
 from key_manager import get_ganache_key
 
 def revoke_hospital():
@@ -11,7 +13,7 @@ def revoke_hospital():
     # 1. SETUP
     try:
         config = load_json("system_config.json")
-        contract = w3.eth.contract(address=config['contract_address'], abi=config['abi'])
+        contract = get_contract(config['contract_address'])
     except Exception as e:
         print(f"❌ Error loading system: {e}")
         return
@@ -48,51 +50,48 @@ def revoke_hospital():
     banned_hospital = hospitals[choice]
     print(f"\n[Action] ⛔ REVOKING LICENSE FOR: {banned_hospital['name']}...")
 
-    # 4. REBUILD TREE EXCLUDING THE BAD HOSPITAL
-    new_valid_list = []
-    valid_indices = [] # Keep track of who is still valid
+    # 4. ADD THE HOSPITAL'S DID TO THE REVOCATION REGISTRY
+    # A sparse Merkle tree keyed by DID: one path changes, the allowlist
+    # (HBMT) is untouched, so surviving owners keep their proof files.
+    hospital_ids = list(hospitals.keys())
+    survivors = [key for key in hospital_ids if key != choice]
 
-    for key, info in hospitals.items():
+    for key in hospital_ids:
         if key != choice:
-            new_valid_list.append(info['data'])
-            valid_indices.append(key)
-            print(f"   ✅ Retaining: {info['name']}")
+            print(f"   ✅ Retaining: {hospitals[key]['name']}")
         else:
-            print(f"   ❌ Dropping:  {info['name']}")
+            print(f"   ❌ Dropping:  {hospitals[key]['name']}")
 
-    # Generate New Root
-    if not new_valid_list:
+    if not survivors:
         print("❌ Error: Cannot ban everyone. Tree must have at least 1 leaf.")
         return
 
-    mt = MerkleTree(new_valid_list)
-    new_root = mt.get_root()
+    if os.path.exists(REVOCATION_REGISTRY):
+        registry = SparseMerkleTree.load(REVOCATION_REGISTRY)
+    else:
+        registry = SparseMerkleTree()
+
+    if registry.contains(banned_hospital['did']):
+        print("❌ Error: This hospital is already revoked.")
+        return
+
+    registry.set(banned_hospital['did'], f"REVOKED:{int(time.time())}")
+    new_root = registry.get_root()
     
-    print(f"\n[Result] New Hospital Root: {new_root[:15]}...")
+    print(f"\n[Result] New Revocation Root: {new_root[:15]}...")
 
     # 5. UPDATE BLOCKCHAIN
+    # Anchored next to the LG's allowlist root with the same publishMerkleRoot
     print("[Blockchain] 📡 Updating Ledger...")
     try:
-        tx = contract.functions.publishMerkleRoot(LG.did, new_root).build_transaction({
-            'from': LG.address,
-            'nonce': w3.eth.get_transaction_count(LG.address),
-            'gas': 3000000,
-            'gasPrice': w3.to_wei('20', 'gwei')
-        })
-        signed_tx = w3.eth.account.sign_transaction(tx, LG.account.key)
-        w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        LG.send_transaction(contract.functions.publishMerkleRoot(revocation_anchor(LG.did), new_root))
         print(f"[Success] ✅ Root updated on Blockchain.")
         
-        # --- NEW STEP: ISSUE FRESH PROOFS TO SURVIVORS ---
-        print("\n[Maintenance] 🔄 Issuing NEW Merkle Proofs to valid hospitals...")
-        for i, vc_str in enumerate(new_valid_list):
-            proof = mt.get_proof(vc_str)
-            owner_id = valid_indices[i] # Get the original ID (e.g., "1" or "3")
-            
-            # Overwrite the old proof file
-            filename = f"merkle_proof_owner_{owner_id}.json"
-            save_json(filename, proof)
-            print(f"   🎟️  Updated proof for Owner {owner_id}")
+        # --- PUBLISH THE REGISTRY ---
+        # Owners derive their own non-revocation proofs from it (a cheap
+        # O(log n) refresh); no per-owner proof file is rewritten.
+        registry.save(REVOCATION_REGISTRY)
+        print(f"\n[Maintenance] 🔄 Revocation registry published to {REVOCATION_REGISTRY}")
 
         print(f"\n[Complete] {banned_hospital['name']} is now mathematically locked out.")
 
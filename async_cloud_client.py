@@ -0,0 +1,292 @@
+import asyncio
+import json
+import ssl
+import time
+import uuid
+import websockets
+from chunk_protocol import ChunkReassembler, ack_frame
+from relay_config import resolve_relay_url
+from delivery import DeliveryTracker, READ, read_frame, broadcast_frame, split_recipients, BROADCAST_RECEIPT_TIMEOUT
+
+# --- ASYNCIO CLOUD CLIENT ---
+# Same relay protocol as cloud_client.CloudAgentClient, but without threads
+# or polling: inbound messages go into a BOUNDED Inbox (when the consumer
+# falls behind, the reader keeps draining the socket into the overflow and
+# only then stops reading, so the relay/TCP window applies backpressure
+# instead of memory growing), consumers 'async for' over messages(), and
+# callers await 'connected' instead of sleeping in a loop.
+#
+#     client = AsyncCloudAgentClient(my_did)
+#     await client.connect()
+#     await client.send(target_did, "M1", payload)
+#     async for msg in client.messages():
+#         ...
+
+QUEUE_SIZE = 64
+OVERFLOW_SIZE = 1024
+REGISTER_INTERVAL = 15 # Re-register so a recycled relay instance relearns us
+PING_INTERVAL = 10
+PING_TIMEOUT = 5
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+class Inbox:
+    """
+    Frames waiting for the consumer: 'size' plus 'overflow' more, so the
+    reader keeps processing pongs, receipts and chunk acks through a stall.
+    Only when both are full does put() wait, and such a stall is not held
+    against the link by the keepalive (see _ping_loop).
+    """
+    def __init__(self, size=QUEUE_SIZE, overflow=OVERFLOW_SIZE):
+        self.frames = asyncio.Queue(maxsize=size + overflow)
+        self.blocked = False
+        self.stalls = 0
+
+    async def put(self, data):
+        try:
+            self.frames.put_nowait(data)
+            return
+        except asyncio.QueueFull:
+            pass
+        self.blocked = True
+        self.stalls += 1
+        try:
+            await self.frames.put(data)
+        finally:
+            self.blocked = False
+
+    async def get(self):
+        return await self.frames.get()
+
+class AsyncCloudAgentClient:
+    def __init__(self, my_did, url=None, queue_size=QUEUE_SIZE):
+        self.url = resolve_relay_url(url)
+        self.did = my_did
+        self.inbound = Inbox(queue_size)
+        self.connected = asyncio.Event()
+        self.send_lock = asyncio.Lock() # Per client: one frame on the socket at a time
+        self.reassembler = ChunkReassembler()
+        self.delivery = DeliveryTracker()
+        self.ws = None
+        self.running = False
+        self._tasks = []
+
+    async def connect(self, timeout=5):
+        """Starts the connection loop and waits (up to 'timeout') until registered"""
+        if not self.running:
+            self.running = True
+            self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._keep_alive_loop()),
+                           asyncio.create_task(self._ping_loop())]
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+            print(f"[{self.did}] ✅ Ready for Secure Messaging.")
+        except asyncio.TimeoutError:
+            print(f"[{self.did}] ⚠️ Connection Unstable. Will retry automatically.")
+
+    async def close(self):
+        self.running = False
+        if self.ws:
+            await self.ws.close() # Clean close first, so the relay sees 1000
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.connected.clear()
+
+    async def _run(self):
+        sslopt = ssl.create_default_context()
+        sslopt.check_hostname = False
+        sslopt.verify_mode = ssl.CERT_NONE # Same as the threaded client
+        delay = RECONNECT_DELAY
+        while self.running:
+            try:
+                # Library keepalive off: its pongs are only read with the frames,
+                # so a busy consumer would get the connection closed (_ping_loop)
+                async with websockets.connect(self.url, ssl=sslopt if self.url.startswith("wss") else None,
+                                              ping_interval=None) as ws:
+                    self.ws = ws
+                    await self._register()
+                    self.connected.set()
+                    print(f"[{self.did}] ☁️  Connected to Cloud Relay.")
+                    delay = RECONNECT_DELAY
+                    async for message in ws:
+                        await self._on_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{self.did}] ⚠️ Socket Error: {e}")
+            finally:
+                self.connected.clear()
+                self.ws = None
+            if self.running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _register(self):
+        async with self.send_lock:
+            await self.ws.send(json.dumps({"type": "register", "did": self.did}))
+
+    async def _keep_alive_loop(self):
+        while self.running:
+            await asyncio.sleep(REGISTER_INTERVAL)
+            if self.connected.is_set():
+                try:
+                    await self._register()
+                except Exception as e:
+                    print(f"[{self.did}] ⚠️ Registration Failed: {e}")
+
+    def _reader_stalls(self):
+        return self.inbound.stalls, self.inbound.blocked
+
+    async def _ping_loop(self):
+        """Keepalive that tells a dead link from our own backpressure"""
+        while self.running:
+            await asyncio.sleep(PING_INTERVAL)
+            ws = self.ws
+            if ws is None or not self.connected.is_set():
+                continue
+            stalls, _ = self._reader_stalls()
+            try:
+                pong = await ws.ping()
+                await asyncio.wait_for(asyncio.shield(pong), PING_TIMEOUT)
+            except asyncio.TimeoutError:
+                now_stalls, blocked = self._reader_stalls()
+                if blocked or now_stalls != stalls:
+                    continue # The pong is just waiting behind the consumer
+                print(f"[{self.did}] ⚠️ Keepalive ping timeout. Reconnecting...")
+                await ws.close(1011, "keepalive ping timeout")
+            except Exception:
+                pass # Closed meanwhile; _run reconnects
+
+    async def _on_message(self, message):
+        try:
+            data = json.loads(message)
+        except ValueError as e:
+            print(f"[{self.did}] ⚠️ Error parsing msg: {e}")
+            return
+
+        if data.get('type') == "CHUNK":
+            # Large payloads from CloudAgentClient.send_large
+            ack, body = self.reassembler.add(data)
+            await self._send_frame(ack_frame(data['to'], data['from'], data['payload']['transfer_id'], ack))
+            if body is None:
+                return
+            data = {"type": data['payload']['msg_type'], "from": data['from'],
+                    "to": data['to'], "payload": json.loads(body)}
+        elif data.get('type') == "CHUNK_ACK":
+            return
+        elif data.get('type') == "DELIVERY":
+            self.delivery.update(data['payload']['msg_id'], data['payload']['status'])
+            return
+        elif data.get('type') == "READ":
+            self.delivery.update(data['payload']['msg_id'], READ)
+            return
+
+        await self._enqueue(data)
+
+    async def _enqueue(self, data):
+        # Blocks once the overflow is full too: we stop reading until the consumer catches up
+        await self.inbound.put(data)
+
+    async def _send_frame(self, msg):
+        async with self.send_lock:
+            await self.ws.send(json.dumps(msg))
+
+    async def send(self, target_did, msg_type, payload, attempts=3, timeout=10):
+        """
+        Waits for the connection (no spinning) and sends; retries across
+        reconnects. Returns the msg_id (None on failure) for delivery_status().
+        """
+        return await self._send_as(self.did, target_did, msg_type, payload, attempts, timeout)
+
+    async def _send_as(self, sender_did, target_did, msg_type, payload, attempts=3, timeout=10):
+        msg_id = uuid.uuid4().hex
+        msg = {
+            "type": msg_type,
+            "from": sender_did,
+            "to": target_did,
+            "msg_id": msg_id,
+            "payload": payload
+        }
+        self.delivery.sent(msg_id, target_did, msg_type)
+        for _ in range(attempts):
+            try:
+                await asyncio.wait_for(self.connected.wait(), timeout)
+                await self._send_frame(msg)
+                print(f"[{sender_did}] 📤 Sent {msg_type} to {target_did}")
+                return msg_id
+            except Exception as e:
+                print(f"[{sender_did}] ⚠️ Send Failed ({e}). Waiting for reconnect...")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+        print(f"[{sender_did}] ❌ Final Send Error: Could not deliver to {target_did}")
+        return None
+
+    async def broadcast(self, target_dids, msg_type, payload, timeout=10):
+        """
+        One frame for many DIDs, fanned out by the relay. Returns
+        {target_did: msg_id} (msg_id None if the frame could not be sent).
+        """
+        return await self._broadcast_as(self.did, target_dids, msg_type, payload, timeout)
+
+    async def _broadcast_as(self, sender_did, target_dids, msg_type, payload, timeout=10):
+        to_many = {did: uuid.uuid4().hex for did in dict.fromkeys(target_dids)}
+        if not to_many:
+            return {}
+        for did, msg_id in to_many.items():
+            self.delivery.sent(msg_id, did, msg_type)
+
+        result = {}
+        for part in split_recipients(to_many):
+            try:
+                await asyncio.wait_for(self.connected.wait(), timeout)
+                await self._send_frame(broadcast_frame(sender_did, msg_type, part, payload))
+                result.update(part)
+            except Exception as e:
+                print(f"[{sender_did}] ❌ Broadcast Error: {e}")
+                result.update(dict.fromkeys(part))
+        print(f"[{sender_did}] 📤 Broadcast {msg_type} to {len(to_many)} recipients")
+
+        # An old relay drops "to_many" frames without a receipt: send one by one instead
+        sent = {did: msg_id for did, msg_id in result.items() if msg_id}
+        if sent and not await self._wait_answered(list(sent.values()), BROADCAST_RECEIPT_TIMEOUT):
+            print(f"[{sender_did}] ⚠️ No receipts for {msg_type} broadcast, sending to each target")
+            msg_ids = await asyncio.gather(*(self._send_as(sender_did, did, msg_type, payload) for did in sent))
+            result.update(zip(sent, msg_ids))
+        return result
+
+    async def _wait_answered(self, msg_ids, timeout):
+        # The tracker's condition is a threading one: poll instead of blocking the loop
+        deadline = time.time() + timeout
+        while not self.delivery.answered(msg_ids):
+            if time.time() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def delivery_status(self, msg_id):
+        """sent / stored / delivered / read / dropped / expired (see delivery.py)"""
+        return self.delivery.status(msg_id)
+
+    def target_status(self, target_did):
+        return self.delivery.target_status(target_did)
+
+    async def _taken(self, msg):
+        """The consumer has the message: send the sender a read receipt"""
+        if msg.get('msg_id') and msg.get('from'):
+            try:
+                await self._send_frame(read_frame(msg.get('to', self.did), msg['from'], msg['msg_id']))
+            except Exception:
+                pass # Best effort, like the threaded client
+        return msg
+
+    async def recv(self, timeout=None):
+        """Next inbound message (None on timeout)"""
+        try:
+            return await self._taken(await asyncio.wait_for(self.inbound.get(), timeout))
+        except asyncio.TimeoutError:
+            return None
+
+    async def messages(self):
+        """async for msg in client.messages(): ..."""
+        while True:
+            yield await self._taken(await self.inbound.get())
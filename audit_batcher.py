@@ -0,0 +1,116 @@
+import atexit
+import json
+import os
+import threading
+import time
+from merkle_utils import BinaryMerkleTree, verify_merkle_proof
+
+# --- BATCHED AUDIT LOGGING ---
+# One logAudit transaction per event is the owner node's biggest gas cost.
+# Events are buffered locally instead; every BATCH_SIZE events (or every
+# FLUSH_INTERVAL seconds) they become the leaves of a Merkle tree and only
+# the root goes on chain, through the existing logAudit:
+#
+#     logAudit(verifier_did, "AUDIT_BATCH", "AUDIT_BATCH:<root>:<count>")
+#
+# Each event keeps its inclusion proof in AUDIT_DIR, so 16_verify_audit.py
+# can still check any single record against the anchored root.
+
+BATCH_SUBJECT = "AUDIT_BATCH"
+AUDIT_DIR = "audit_batches"
+BATCH_SIZE = 32
+FLUSH_INTERVAL = 30
+
+def batch_action(root, count):
+    return f"{BATCH_SUBJECT}:{root}:{count}"
+
+def parse_batch_action(action):
+    """(root, count) if 'action' anchors an audit batch, else None"""
+    parts = action.split(":")
+    if len(parts) != 3 or parts[0] != BATCH_SUBJECT:
+        return None
+    try:
+        return parts[1], int(parts[2])
+    except ValueError:
+        return None
+
+def event_leaf(event):
+    return json.dumps(event, sort_keys=True)
+
+class AuditBatcher:
+    def __init__(self, entity, contract, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, audit_dir=AUDIT_DIR):
+        self.entity = entity
+        self.contract = contract
+        self.batch_size = batch_size
+        self.audit_dir = audit_dir
+        self.pending = []
+        self.seq = 0
+        self.lock = threading.Lock()
+        os.makedirs(audit_dir, exist_ok=True)
+        atexit.register(self.flush) # Don't lose a half-full batch on shutdown
+
+        if flush_interval:
+            t = threading.Thread(target=self._flush_loop, args=(flush_interval,))
+            t.daemon = True
+            t.start()
+
+    def record(self, subject, action):
+        """Buffers one audit event; anchors the batch once it is full"""
+        with self.lock:
+            self.seq += 1
+            self.pending.append({
+                "verifier": self.entity.did,
+                "subject": subject,
+                "action": action,
+                "timestamp": int(time.time()),
+                "seq": self.seq # Keeps identical events distinct leaves
+            })
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[{self.entity.name}] ⚠️ Audit batch error: {e}")
+
+    def flush(self):
+        """Anchors every buffered event under one Merkle root (one transaction)"""
+        with self.lock:
+            events, self.pending = self.pending, []
+        if not events:
+            return None
+
+        tree = BinaryMerkleTree([event_leaf(event) for event in events])
+        root = tree.get_root()
+        records = [{"event": event, "proof": proof}
+                   for event, proof in zip(events, tree.get_all_proofs())]
+
+        # Proofs are written before the anchor so no anchored event lacks one
+        path = os.path.join(self.audit_dir, f"batch_{root}.json")
+        with open(path, 'w') as f:
+            json.dump({"root": root, "count": len(events), "records": records}, f, indent=4)
+
+        self.entity.send_transaction(
+            self.contract.functions.logAudit(self.entity.did, BATCH_SUBJECT, batch_action(root, len(events)))
+        )
+        print(f"[{self.entity.name}] 📝 Anchored {len(events)} audit events (root {root[:15]}...)")
+        return root
+
+def load_audit_batch(root, audit_dir=AUDIT_DIR):
+    """Locally kept records of the batch anchored under 'root' (None if missing)"""
+    try:
+        with open(os.path.join(audit_dir, f"batch_{root}.json"), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def verify_audit_record(record, root):
+    """True if one event + its proof belong to the batch anchored under 'root'"""
+    try:
+        return verify_merkle_proof(event_leaf(record['event']), record['proof'], root)
+    except (KeyError, TypeError):
+        return False
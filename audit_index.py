@@ -0,0 +1,201 @@
+import sqlite3
+from eth_utils import keccak
+from audit_batcher import BATCH_SUBJECT, AUDIT_DIR, parse_batch_action, load_audit_batch, verify_audit_record
+
+# --- INCREMENTAL AUDIT INDEX ---
+# Pulling every AuditLog from 'earliest' on each forensic query gets slower
+# with every block. Instead we walk the chain in CHUNK_SIZE-block windows,
+# store each decoded event in SQLite and remember the last block processed,
+# so a query only has to fetch the blocks mined since the previous sync.
+#
+# verifier/subject are 'string indexed' in the event, so the chain only keeps
+# keccak(did): we store that topic hash and hash the DID when querying.
+#
+# Owner nodes log in Merkle batches (audit_batcher.py), so most events only
+# exist in AUDIT_DIR under an on-chain "AUDIT_BATCH:<root>:<count>" anchor.
+# Every record whose proof checks against its anchored root is indexed too,
+# and the queries below return both kinds (batched ones have seq >= 0).
+
+AUDIT_INDEX_DB = "audit_index.db"
+CHUNK_SIZE = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_events (
+    contract TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    verifier_hash TEXT NOT NULL,
+    subject_hash TEXT NOT NULL,
+    action TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (contract, block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS idx_audit_verifier ON audit_events (verifier_hash, timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_subject ON audit_events (subject_hash, timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_action ON audit_events (action, timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_events (timestamp);
+CREATE TABLE IF NOT EXISTS audit_batches (
+    contract TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    root TEXT NOT NULL,
+    proven INTEGER NOT NULL,
+    PRIMARY KEY (contract, block_number, log_index)
+);
+CREATE TABLE IF NOT EXISTS audit_batch_events (
+    contract TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    verifier_hash TEXT NOT NULL,
+    subject_hash TEXT NOT NULL,
+    action TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (contract, block_number, log_index, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_batch_verifier ON audit_batch_events (verifier_hash, timestamp);
+CREATE INDEX IF NOT EXISTS idx_batch_subject ON audit_batch_events (subject_hash, timestamp);
+CREATE INDEX IF NOT EXISTS idx_batch_action ON audit_batch_events (action, timestamp);
+CREATE INDEX IF NOT EXISTS idx_batch_time ON audit_batch_events (timestamp);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    contract TEXT PRIMARY KEY,
+    last_block INTEGER NOT NULL
+);
+"""
+
+def topic_hash(text):
+    """What the chain keeps for a 'string indexed' event argument"""
+    return keccak(text=text).hex()
+
+class AuditIndex:
+    def __init__(self, w3, contract, db_path=AUDIT_INDEX_DB, chunk_size=CHUNK_SIZE, audit_dir=AUDIT_DIR):
+        self.w3 = w3
+        self.contract = contract
+        self.address = contract.address
+        self.chunk_size = chunk_size
+        self.audit_dir = audit_dir
+        self.db = sqlite3.connect(db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def last_block(self):
+        row = self.db.execute("SELECT last_block FROM checkpoints WHERE contract = ?", (self.address,)).fetchone()
+        return row['last_block'] if row else -1
+
+    def sync(self):
+        """Indexes every block since the checkpoint; returns the number of new events"""
+        head = self.w3.eth.block_number
+        start = self.last_block() + 1
+        added = 0
+        while start <= head:
+            end = min(start + self.chunk_size - 1, head)
+            logs = self.contract.events.AuditLog.get_logs(from_block=start, to_block=end)
+            rows = [(
+                self.address,
+                log['blockNumber'],
+                log['logIndex'],
+                bytes(log['transactionHash']).hex(),
+                bytes(log['args']['verifier']).hex(),
+                bytes(log['args']['subject']).hex(),
+                log['args']['action'],
+                log['args']['timestamp']
+            ) for log in logs]
+
+            # Events and checkpoint commit together: a crash never skips blocks
+            with self.db:
+                self.db.executemany("INSERT OR IGNORE INTO audit_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (self.address, end))
+            added += len(rows)
+            start = end + 1
+        self.sync_batches()
+        return added
+
+    def sync_batches(self):
+        """
+        Indexes the records of every anchored batch not indexed yet. A batch
+        whose local file is missing is retried on the next sync. Returns the
+        number of new batched events.
+        """
+        anchors = self.db.execute(
+            "SELECT e.block_number, e.log_index, e.tx_hash, e.action FROM audit_events e "
+            "LEFT JOIN audit_batches b ON b.contract = e.contract AND b.block_number = e.block_number "
+            "AND b.log_index = e.log_index "
+            "WHERE e.contract = ? AND e.action >= ? AND e.action < ? AND b.root IS NULL",
+            (self.address, BATCH_SUBJECT + ":", BATCH_SUBJECT + ":\uffff")).fetchall()
+
+        added = 0
+        for anchor in anchors:
+            parsed = parse_batch_action(anchor['action'])
+            if parsed is None:
+                continue
+            root = parsed[0]
+            batch = load_audit_batch(root, self.audit_dir)
+            if batch is None:
+                continue
+
+            # Only records provably under the on-chain root are indexed
+            rows = [(
+                self.address,
+                anchor['block_number'],
+                anchor['log_index'],
+                record['event']['seq'],
+                anchor['tx_hash'],
+                topic_hash(record['event']['verifier']),
+                topic_hash(record['event']['subject']),
+                record['event']['action'],
+                record['event']['timestamp']
+            ) for record in batch.get('records', []) if verify_audit_record(record, root)]
+
+            with self.db:
+                self.db.executemany("INSERT OR IGNORE INTO audit_batch_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.db.execute("INSERT OR REPLACE INTO audit_batches VALUES (?, ?, ?, ?, ?)",
+                                (self.address, anchor['block_number'], anchor['log_index'], root, len(rows)))
+            added += len(rows)
+        return added
+
+    # --- QUERIES (newest first) ---
+
+    _COLUMNS = "block_number, log_index, tx_hash, verifier_hash, subject_hash, action, timestamp"
+
+    def _query(self, where="", params=(), limit=None):
+        # On-chain events (seq -1) and the batched events under each anchor
+        sql = (f"SELECT {self._COLUMNS}, -1 AS seq FROM audit_events WHERE contract = ? {where} "
+               f"UNION ALL "
+               f"SELECT {self._COLUMNS}, seq FROM audit_batch_events WHERE contract = ? {where} "
+               f"ORDER BY block_number DESC, log_index DESC, seq DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        params = tuple(params)
+        return [dict(row) for row in self.db.execute(sql, (self.address,) + params + (self.address,) + params)]
+
+    def count(self):
+        """On-chain AuditLog events"""
+        return self.db.execute("SELECT COUNT(*) FROM audit_events WHERE contract = ?", (self.address,)).fetchone()[0]
+
+    def batch_count(self):
+        """Proven events indexed from anchored batches"""
+        return self.db.execute("SELECT COUNT(*) FROM audit_batch_events WHERE contract = ?", (self.address,)).fetchone()[0]
+
+    def latest(self, limit=10):
+        return self._query(limit=limit)
+
+    def by_verifier(self, did, limit=None):
+        return self._query("AND verifier_hash = ?", (topic_hash(did),), limit)
+
+    def by_subject(self, did, limit=None):
+        return self._query("AND subject_hash = ?", (topic_hash(did),), limit)
+
+    def by_action(self, action, limit=None):
+        return self._query("AND action = ?", (action,), limit)
+
+    def by_action_prefix(self, prefix, limit=None):
+        # Range scan instead of LIKE so the action index is used
+        return self._query("AND action >= ? AND action < ?", (prefix, prefix + "\uffff"), limit)
+
+    def between(self, start_time, end_time, limit=None):
+        return self._query("AND timestamp BETWEEN ? AND ?", (start_time, end_time), limit)
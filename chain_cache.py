@@ -0,0 +1,241 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- ON-CHAIN READ CACHES ---
+# Verifiers keep asking the chain the same questions ("what is this DID's
+# public key?", "what is this issuer's Merkle root?"). The answers only
+# change when a transaction calls the contract, so we cache them locally and
+# let a BlockWatcher drop an entry as soon as a block contains a call that
+# could have changed it.
+
+class BlockWatcher:
+    """
+    Polls for new blocks on a daemon thread and reports every transaction
+    sent to 'contract' as (function_name, sender, args) to its subscribers.
+    """
+    def __init__(self, w3, contract, poll_interval=1.0):
+        self.w3 = w3
+        self.contract = contract
+        self.address = contract.address.lower()
+        self.poll_interval = poll_interval
+        self.subscribers = []
+        self.last_block = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+        self.start()
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        try:
+            # Pin the starting block now, before any cache read: a change mined
+            # between that read and the first poll must not be skipped
+            self.last_block = self.w3.eth.block_number
+        except Exception as e:
+            print(f"⚠️ Block watcher error: {e}") # The first poll sets it instead
+        t = threading.Thread(target=self._poll_loop)
+        t.daemon = True
+        t.start()
+
+    def stop(self):
+        self.running = False
+
+    def _poll_loop(self):
+        while self.running:
+            try:
+                head = self.w3.eth.block_number
+                if self.last_block is None:
+                    self.last_block = head # Node was unreachable in start()
+                while self.last_block < head:
+                    # Only advance once the block is fully scanned: a failed
+                    # get_block or subscriber retries it on the next poll
+                    self._scan_block(self.last_block + 1)
+                    self.last_block += 1
+            except Exception as e:
+                print(f"⚠️ Block watcher error: {e}")
+            time.sleep(self.poll_interval)
+
+    def _scan_block(self, number):
+        block = self.w3.eth.get_block(number, full_transactions=True)
+        for tx in block['transactions']:
+            if not tx.get('to') or tx['to'].lower() != self.address:
+                continue
+            try:
+                func, args = self.contract.decode_function_input(tx['input'])
+            except Exception:
+                continue # Not a call we know how to decode
+            with self.lock:
+                subscribers = list(self.subscribers)
+            # Every subscriber runs even if one fails; the block is then
+            # re-scanned, so callbacks must be idempotent (invalidations are)
+            error = None
+            for callback in subscribers:
+                try:
+                    callback(func.fn_name, tx['from'], args, number)
+                except Exception as e:
+                    error = error or e
+            if error:
+                raise error
+
+class RegistryCache:
+    """
+    DID registry reader: address -> (did, publicKey, exists).
+    Entries expire after 'ttl' seconds, the least recently used entry is
+    evicted past 'max_entries', and a 'register' transaction from an address
+    invalidates that address immediately (when a watcher is attached).
+    Like RootCache, every invalidation bumps the address's version, so a read
+    that raced a 'register' is not cached.
+    """
+    def __init__(self, contract, ttl=300, max_entries=4096, watcher=None):
+        self.contract = contract
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.versions = {} # address -> version
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if watcher:
+            watcher.subscribe(self._on_contract_call)
+
+    def get(self, address):
+        key = address.lower()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            version = self.versions.get(key, 0)
+
+        user_data = self.contract.functions.registry(address).call()
+        self.put(address, user_data, version)
+        return user_data
+
+    def put(self, address, user_data, version):
+        """Caches an entry read while 'version' was current"""
+        key = address.lower()
+        with self.lock:
+            # A register seen while we were reading makes this answer stale
+            if self.versions.get(key, 0) != version:
+                return
+            self.entries[key] = (user_data, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def version(self, address):
+        with self.lock:
+            return self.versions.get(address.lower(), 0)
+
+    def invalidate(self, address):
+        key = address.lower()
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            self.entries.pop(key, None)
+
+    def _on_contract_call(self, fn_name, sender, args, block_number):
+        # register() writes registry[msg.sender]
+        if fn_name == "register":
+            self.invalidate(sender)
+
+class RootCache:
+    """
+    Merkle roots anchored with publishMerkleRoot: issuer DID -> root.
+    Each issuer has a version number that goes up every time a block
+    carries a publishMerkleRoot for it, so a verifier holding (root, version)
+    can ask is_current() instead of re-reading the chain.
+    """
+    def __init__(self, contract, ttl=300, watcher=None):
+        self.contract = contract
+        self.ttl = ttl
+        self.entries = {}  # issuer_did -> (root, version, expires)
+        self.versions = {} # issuer_did -> version
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if watcher:
+            watcher.subscribe(self._on_contract_call)
+
+    def get(self, issuer_did):
+        return self.get_versioned(issuer_did)[0]
+
+    def get_versioned(self, issuer_did):
+        """(root, version) for 'issuer_did', reading the chain only on a miss"""
+        with self.lock:
+            entry = self.entries.get(issuer_did)
+            if entry and entry[2] > time.time():
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            version = self.versions.get(issuer_did, 0)
+
+        root = self.contract.functions.getMerkleRoot(issuer_did).call()
+        self.put(issuer_did, root, version)
+        return root, version
+
+    def put(self, issuer_did, root, version):
+        """Caches a root read while 'version' was current"""
+        with self.lock:
+            # A publish seen while we were reading makes this answer stale
+            if self.versions.get(issuer_did, 0) == version:
+                self.entries[issuer_did] = (root, version, time.time() + self.ttl)
+
+    def version(self, issuer_did):
+        with self.lock:
+            return self.versions.get(issuer_did, 0)
+
+    def is_current(self, issuer_did, version):
+        return self.version(issuer_did) == version
+
+    def invalidate(self, issuer_did):
+        with self.lock:
+            self.versions[issuer_did] = self.versions.get(issuer_did, 0) + 1
+            self.entries.pop(issuer_did, None)
+
+    def _on_contract_call(self, fn_name, sender, args, block_number):
+        if fn_name == "publishMerkleRoot":
+            self.invalidate(args['_issuerDid'])
+
+_watchers = {}
+_registry_caches = {}
+_root_caches = {}
+_shared_lock = threading.Lock()
+
+def get_block_watcher(w3, contract):
+    """One watcher per contract, shared by every cache in the process"""
+    with _shared_lock:
+        watcher = _watchers.get(contract.address)
+        if watcher is None:
+            watcher = BlockWatcher(w3, contract)
+            _watchers[contract.address] = watcher
+        return watcher
+
+def _shared_cache(caches, cache_class, w3, contract):
+    with _shared_lock:
+        cache = caches.get(contract.address)
+    if cache is None:
+        watcher = get_block_watcher(w3, contract)
+        with _shared_lock:
+            cache = caches.get(contract.address)
+            if cache is None:
+                cache = cache_class(contract, watcher=watcher)
+                caches[contract.address] = cache
+    return cache
+
+def get_registry_cache(w3, contract):
+    """Process-wide RegistryCache for 'contract', kept fresh by block watching"""
+    return _shared_cache(_registry_caches, RegistryCache, w3, contract)
+
+def get_root_cache(w3, contract):
+    """Process-wide RootCache for 'contract', kept fresh by block watching"""
+    return _shared_cache(_root_caches, RootCache, w3, contract)
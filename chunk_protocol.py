@@ -0,0 +1,78 @@
+import threading
+import time
+
+# --- CHUNKED TRANSFER ---
+# Large payloads (model updates) are split into CHUNK frames that the relay
+# forwards like any other message:
+#   CHUNK     {"transfer_id", "msg_type", "seq", "total", "data"}
+#   CHUNK_ACK {"transfer_id", "ack"}   ack = chunks received in order so far
+# The sender keeps up to CHUNK_WINDOW chunks in flight and, when acks stop
+# (relay blip, reconnect), resumes from the last acknowledged chunk instead
+# of re-sending everything. Shared by cloud_client and async_cloud_client.
+CHUNK_SIZE = 256 * 1024   # Characters of serialized payload per frame
+CHUNK_WINDOW = 8
+CHUNK_ACK_TIMEOUT = 10    # Seconds without progress before resending
+CHUNK_MAX_STALLS = 5
+TRANSFER_TTL = 600        # Partial inbound transfers are dropped after this
+
+def chunk_frame(sender_did, target_did, transfer_id, msg_type, seq, total, data):
+    return {
+        "type": "CHUNK",
+        "from": sender_did,
+        "to": target_did,
+        "payload": {
+            "transfer_id": transfer_id,
+            "msg_type": msg_type,
+            "seq": seq,
+            "total": total,
+            "data": data
+        }
+    }
+
+def ack_frame(sender_did, target_did, transfer_id, ack):
+    return {
+        "type": "CHUNK_ACK",
+        "from": sender_did,
+        "to": target_did,
+        "payload": {"transfer_id": transfer_id, "ack": ack}
+    }
+
+class ChunkReassembler:
+    """Receiver side: collects CHUNK frames until a transfer is complete"""
+    def __init__(self):
+        self.inbound = {}
+        self.completed = {}
+        self.lock = threading.Lock()
+
+    def add(self, frame):
+        """
+        Stores one CHUNK frame. Returns (ack, body): 'ack' is what to send
+        back in CHUNK_ACK, 'body' is the serialized payload once complete.
+        """
+        chunk = frame['payload']
+        transfer_id = chunk['transfer_id']
+        now = time.time()
+
+        with self.lock:
+            if transfer_id in self.completed:
+                # Our last ack was lost: confirm again so the sender can finish
+                return chunk['total'], None
+
+            for stale_id in [t for t, st in self.inbound.items() if now - st['updated'] > TRANSFER_TTL]:
+                del self.inbound[stale_id]
+            for old_id in [t for t, done in self.completed.items() if now - done > TRANSFER_TTL]:
+                del self.completed[old_id]
+
+            state = self.inbound.setdefault(transfer_id, {"chunks": {}, "next": 0})
+            state['updated'] = now
+            if chunk['seq'] >= state['next']:
+                state['chunks'][chunk['seq']] = chunk['data']
+            while state['next'] in state['chunks']:
+                state['next'] += 1
+
+            if state['next'] < chunk['total']:
+                return state['next'], None
+
+            del self.inbound[transfer_id]
+            self.completed[transfer_id] = now
+            return state['next'], "".join(state['chunks'][i] for i in range(chunk['total']))
@@ -3,11 +3,17 @@ import json
 import threading
 import time
 import ssl
+import uuid
+from chunk_protocol import (CHUNK_SIZE, CHUNK_WINDOW, CHUNK_ACK_TIMEOUT, CHUNK_MAX_STALLS,
+                            ChunkReassembler, chunk_frame, ack_frame)
+from relay_config import resolve_relay_url
+from delivery import (DeliveryTracker, DELIVERED, READ, read_frame, broadcast_frame, split_recipients,
+                      BROADCAST_RECEIPT_TIMEOUT)
 
 class CloudAgentClient:
-    def __init__(self, my_did, message_callback=None):
-        # Live Cloudflare Relay
-        self.url = "wss://ssi-cloud-relay.becse2026fypp1-tno-20.workers.dev"
+    def __init__(self, my_did, message_callback=None, url=None):
+        # Live Cloudflare Relay unless overridden (see relay_config.py)
+        self.url = resolve_relay_url(url)
         
         self.did = my_did
         self.callback = message_callback
@@ -15,6 +21,14 @@ class CloudAgentClient:
         self.is_connected = False
         self.incoming_buffer = []
         self.lock = threading.Lock()
+
+        # Chunked transfers: inbound reassembly and outbound ack tracking
+        self.reassembler = ChunkReassembler()
+        self.transfer_acks = {}
+        self.ack_cond = threading.Condition()
+
+        # Delivery receipts for everything we send (see delivery.py)
+        self.delivery = DeliveryTracker()
         
         # STOP FLAG for background threads
         self.running = True
@@ -38,13 +52,48 @@ class CloudAgentClient:
     def on_message(self, ws, message):
         try:
             data = json.loads(message)
-            if self.callback:
-                self.callback(data)
-            else:
-                self.incoming_buffer.append(data)
+            if data.get('type') == "CHUNK":
+                data = self._on_chunk(data)
+                if data is None:
+                    return # Transfer not complete yet
+            elif data.get('type') == "CHUNK_ACK":
+                self._on_chunk_ack(data['payload'])
+                return
+            elif data.get('type') == "DELIVERY":
+                self.delivery.update(data['payload']['msg_id'], data['payload']['status'])
+                return
+            elif data.get('type') == "READ":
+                self.delivery.update(data['payload']['msg_id'], READ)
+                return
+            self._dispatch(data)
+            if data.get('msg_id') and data.get('from'):
+                # Read receipt once the application has taken the message
+                self._send_frame(read_frame(self.did, data['from'], data['msg_id']), verbose=False, retry=False)
         except Exception as e:
             print(f"[{self.did}] ⚠️ Error parsing msg: {e}")
 
+    def _dispatch(self, data):
+        if self.callback:
+            self.callback(data)
+        else:
+            self.incoming_buffer.append(data)
+
+    def _on_chunk(self, frame):
+        """Stores one chunk, acks, and returns the whole message once complete"""
+        ack, body = self.reassembler.add(frame)
+        # A lost ack is recovered by the sender's resend
+        self._send_frame(ack_frame(self.did, frame['from'], frame['payload']['transfer_id'], ack), verbose=False, retry=False)
+        if body is None:
+            return None
+        return {"type": frame['payload']['msg_type'], "from": frame['from'], "to": frame['to'], "payload": json.loads(body)}
+
+    def _on_chunk_ack(self, ack):
+        with self.ack_cond:
+            transfer_id = ack['transfer_id']
+            if transfer_id in self.transfer_acks:
+                self.transfer_acks[transfer_id] = max(self.transfer_acks[transfer_id], ack['ack'])
+                self.ack_cond.notify_all()
+
     def on_error(self, ws, error):
         if "timed out" not in str(error) and "Connection to remote host" not in str(error):
              print(f"[{self.did}] ⚠️ Socket Error: {error}")
@@ -100,15 +149,117 @@ class CloudAgentClient:
             print(f"[{self.did}] ⚠️ Connection Unstable. Will retry automatically.")
 
     def send(self, target_did, msg_type, payload):
-        """Robust Send with Retry"""
+        """
+        Robust Send with Retry. Returns the msg_id (None if it could not be
+        sent); its progress is in delivery_status(msg_id).
+        """
+        msg_id = uuid.uuid4().hex
         msg = {
             "type": msg_type,
             "from": self.did,
             "to": target_did,
+            "msg_id": msg_id,
             "payload": payload
         }
+        self.delivery.sent(msg_id, target_did, msg_type)
+        return msg_id if self._send_frame(msg) else None
+
+    def broadcast(self, target_dids, msg_type, payload):
+        """
+        Same message to many DIDs: serialized and uploaded once, fanned out
+        by the relay. Returns {target_did: msg_id} (msg_id None if the frame
+        could not be sent); each recipient's progress is in delivery_status().
+        """
+        to_many = {did: uuid.uuid4().hex for did in dict.fromkeys(target_dids)}
+        if not to_many:
+            return {}
+        for did, msg_id in to_many.items():
+            self.delivery.sent(msg_id, did, msg_type)
+
+        result = {}
+        for part in split_recipients(to_many):
+            result.update(part if self._send_frame(broadcast_frame(self.did, msg_type, part, payload)) else dict.fromkeys(part))
+
+        # An old relay drops "to_many" frames without a receipt: send one by one instead
+        sent_ids = [msg_id for msg_id in result.values() if msg_id]
+        if sent_ids and not self.delivery.wait_answered(sent_ids, BROADCAST_RECEIPT_TIMEOUT):
+            print(f"[{self.did}] ⚠️ No receipts for {msg_type} broadcast, sending to each target")
+            for did, msg_id in result.items():
+                if msg_id:
+                    result[did] = self.send(did, msg_type, payload)
+        return result
+
+    def delivery_status(self, msg_id):
+        """sent / stored / delivered / read / dropped / expired (see delivery.py)"""
+        return self.delivery.status(msg_id)
+
+    def target_status(self, target_did):
+        """Status of the latest message sent to 'target_did'"""
+        return self.delivery.target_status(target_did)
+
+    def send_large(self, target_did, msg_type, payload, chunk_size=CHUNK_SIZE):
+        """
+        Sends 'payload' as acknowledged chunks (see chunk_protocol.py).
+        The receiver's on_message reassembles it and delivers one normal
+        message. Returns True once every chunk is acknowledged.
+        """
+        body = json.dumps(payload)
+        chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [""]
+        total = len(chunks)
+        transfer_id = uuid.uuid4().hex
+        with self.ack_cond:
+            self.transfer_acks[transfer_id] = 0
+        self.delivery.sent(transfer_id, target_did, msg_type)
+
+        print(f"[{self.did}] 📦 Sending {msg_type} to {target_did} in {total} chunks ({len(body)} bytes)")
+        try:
+            next_seq = 0
+            stalls = 0
+            while True:
+                with self.ack_cond:
+                    acked = self.transfer_acks[transfer_id]
+                if acked >= total:
+                    self.delivery.update(transfer_id, DELIVERED)
+                    print(f"[{self.did}] 📤 Sent {msg_type} to {target_did} ({total} chunks acknowledged)")
+                    return True
+
+                # Fill the window (after a stall, resume from the last ack)
+                next_seq = max(next_seq, acked)
+                while next_seq < min(acked + CHUNK_WINDOW, total):
+                    self._send_frame(chunk_frame(self.did, target_did, transfer_id, msg_type,
+                                                 next_seq, total, chunks[next_seq]), verbose=False)
+                    next_seq += 1
+
+                with self.ack_cond:
+                    self.ack_cond.wait_for(lambda: self.transfer_acks[transfer_id] > acked, timeout=CHUNK_ACK_TIMEOUT)
+                    progressed = self.transfer_acks[transfer_id] > acked
+                if progressed:
+                    stalls = 0
+                    continue
+
+                stalls += 1
+                if stalls >= CHUNK_MAX_STALLS:
+                    print(f"[{self.did}] ❌ Transfer to {target_did} stalled at chunk {acked}/{total}")
+                    return False
+                print(f"[{self.did}] ⚠️ No ack from {target_did}, resuming from chunk {acked}/{total}")
+                next_seq = acked # Go back to the first unacknowledged chunk
+        finally:
+            with self.ack_cond:
+                self.transfer_acks.pop(transfer_id, None)
+
+    def _send_frame(self, msg, verbose=True, retry=True):
+        msg_type = msg['type']
+        target_did = msg.get('to') or f"{len(msg['to_many'])} recipients"
         json_msg = json.dumps(msg)
 
+        if not retry:
+            try:
+                with self.lock:
+                    self.ws.send(json_msg)
+                return True
+            except Exception:
+                return False
+
         with self.lock:
             attempts = 0
             while attempts < 3:
@@ -117,8 +268,9 @@ class CloudAgentClient:
                         raise Exception("Not connected")
                     
                     self.ws.send(json_msg)
-                    print(f"[{self.did}] 📤 Sent {msg_type} to {target_did}")
-                    return 
+                    if verbose:
+                        print(f"[{self.did}] 📤 Sent {msg_type} to {target_did}")
+                    return True
                 
                 except Exception as e:
                     print(f"[{self.did}] ⚠️ Send Failed ({e}). Reconnecting...")
@@ -132,4 +284,5 @@ class CloudAgentClient:
                     attempts += 1
                     time.sleep(1)
             
-            print(f"[{self.did}] ❌ Final Send Error: Could not deliver to {target_did}")
\ No newline at end of file
+            print(f"[{self.did}] ❌ Final Send Error: Could not deliver to {target_did}")
+            return False
\ No newline at end of file
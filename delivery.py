@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+# --- DELIVERY RECEIPTS ---
+# Every frame sent with send() carries a "msg_id". The relay answers the
+# sender with a DELIVERY frame once it knows what happened to it:
+#     {"type": "DELIVERY", "to": sender, "payload": {"msg_id", "target", "status"}}
+#     status: "delivered" | "stored" (target offline, kept in its mailbox)
+#             | "dropped" (no mailbox / mailbox full) | "expired" (TTL passed)
+# and the receiving client sends back a READ frame once its application has
+# taken the message:
+#     {"type": "READ", "from": receiver, "to": sender, "payload": {"msg_id"}}
+# A relay that predates receipts never answers, so such messages simply stay
+# "sent".
+#
+# broadcast() sends ONE frame for many recipients, each with its own msg_id:
+#     {"type", "from", "to_many": {target: msg_id, ...}, "payload"}
+# and the relay fans it out as ordinary frames ("to": target, "msg_id"), so
+# receivers and receipts work exactly as for send(). A relay refuses frames
+# with more than MAX_BROADCAST_RECIPIENTS targets ("dropped" for each), so
+# clients split larger broadcasts into several frames. A relay that predates
+# "to_many" drops the frame silently: if not a single receipt comes back
+# within BROADCAST_RECEIPT_TIMEOUT, the client re-sends to each target.
+
+SENT = "sent"
+STORED = "stored"
+DELIVERED = "delivered"
+READ = "read"
+DROPPED = "dropped"
+EXPIRED = "expired"
+
+FAILED = (DROPPED, EXPIRED)
+REACHED = (DELIVERED, READ)
+PENDING = (SENT, STORED)
+
+MAX_BROADCAST_RECIPIENTS = 500
+BROADCAST_RECEIPT_TIMEOUT = 5
+
+# Later statuses never get overwritten by earlier ones arriving late
+_RANK = {SENT: 0, STORED: 1, DELIVERED: 2, DROPPED: 2, EXPIRED: 2, READ: 3}
+
+def delivery_frame(target_did, sender_did, msg_id, status):
+    return {
+        "type": "DELIVERY",
+        "from": "relay",
+        "to": sender_did,
+        "payload": {"msg_id": msg_id, "target": target_did, "status": status}
+    }
+
+def broadcast_frame(sender_did, msg_type, to_many, payload):
+    return {"type": msg_type, "from": sender_did, "to_many": to_many, "payload": payload}
+
+def split_recipients(to_many, size=MAX_BROADCAST_RECIPIENTS):
+    """Client side: {target: msg_id} in parts a relay accepts in one frame"""
+    items = list(to_many.items())
+    for i in range(0, len(items), size):
+        yield dict(items[i:i + size])
+
+def fan_out(frame, body=None):
+    """
+    Relay side: (target, msg_id, raw frame) per recipient of a broadcast.
+    The payload is serialized once ('body') and spliced into every frame.
+    """
+    if body is None:
+        body = json.dumps(frame['payload'])
+    for target, msg_id in frame['to_many'].items():
+        head = json.dumps({"type": frame.get('type'), "from": frame.get('from'), "to": target, "msg_id": msg_id})
+        yield target, msg_id, head[:-1] + ', "payload": ' + body + '}'
+
+def read_frame(reader_did, sender_did, msg_id):
+    return {"type": "READ", "from": reader_did, "to": sender_did, "payload": {"msg_id": msg_id}}
+
+class DeliveryTracker:
+    """Per-client record of msg_id -> {target, type, status, updated}"""
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.messages = {}
+        self.by_target = {} # target DID -> latest msg_id sent to it
+        self.cond = threading.Condition()
+
+    def sent(self, msg_id, target_did, msg_type):
+        with self.cond:
+            self.messages[msg_id] = {"target": target_did, "type": msg_type, "status": SENT, "updated": time.time()}
+            self.by_target[target_did] = msg_id
+            if len(self.messages) > self.max_entries:
+                oldest = next(iter(self.messages))
+                del self.messages[oldest]
+
+    def update(self, msg_id, status):
+        with self.cond:
+            entry = self.messages.get(msg_id)
+            if entry is None or _RANK.get(status, -1) < _RANK[entry['status']]:
+                return
+            entry['status'] = status
+            entry['updated'] = time.time()
+            self.cond.notify_all()
+
+    def status(self, msg_id):
+        with self.cond:
+            entry = self.messages.get(msg_id)
+            return entry['status'] if entry else None
+
+    def target_status(self, target_did):
+        """Status of the latest message sent to 'target_did'"""
+        with self.cond:
+            msg_id = self.by_target.get(target_did)
+            return self.messages[msg_id]['status'] if msg_id in self.messages else None
+
+    def summary(self, msg_ids):
+        """{target: status} for a batch of sends"""
+        with self.cond:
+            return {self.messages[m]['target']: self.messages[m]['status'] for m in msg_ids if m in self.messages}
+
+    def answered(self, msg_ids):
+        """True once the relay has said anything about one of 'msg_ids'"""
+        with self.cond:
+            return any(self.messages.get(m, {}).get('status', SENT) != SENT for m in msg_ids)
+
+    def wait_answered(self, msg_ids, timeout=None):
+        """Blocks until answered(msg_ids) (True) or timeout (False)"""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: any(self.messages.get(m, {}).get('status', SENT) != SENT for m in msg_ids), timeout)
+
+    def wait(self, msg_ids, statuses, timeout=None):
+        """Blocks until every msg_id has one of 'statuses' (True) or timeout (False)"""
+        with self.cond:
+            return self.cond.wait_for(
+                lambda: all(self.messages.get(m, {}).get('status') in statuses for m in msg_ids), timeout)
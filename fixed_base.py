@@ -0,0 +1,65 @@
+import threading
+
+# --- FIXED-BASE EXPONENTIATION ---
+# Every ZK proof computes g^r, g^s (and g^x once per identity) for the SAME
+# generator and modulus. Precomputing
+#     table[j][d] = g^(d * 2^(window*j))
+# turns g^e into one multiply per window-sized digit of e: no squarings at
+# all. With window=5 a 2048-bit exponent costs ~410 multiplies instead of the
+# ~2,500 that pow() spends, for a one-off table of ~13k group elements.
+
+DEFAULT_WINDOW = 5
+
+class FixedBaseTable:
+    def __init__(self, base, modulus, window=DEFAULT_WINDOW):
+        self.base = base
+        self.modulus = modulus
+        self.window = window
+        # Exponents are reduced mod (modulus - 1), which never changes g^e
+        self.order = modulus - 1
+        self.windows = (self.order.bit_length() + window - 1) // window
+
+        self.table = []
+        window_base = base % modulus
+        for _ in range(self.windows):
+            row = [1, window_base]
+            for _ in range((1 << window) - 2):
+                row.append(row[-1] * window_base % modulus)
+            self.table.append(row)
+            window_base = row[-1] * window_base % modulus # g^(2^(window*(j+1)))
+
+    def pow(self, exponent):
+        """base^exponent mod modulus using the precomputed table"""
+        if exponent < 0 or exponent.bit_length() > self.order.bit_length():
+            exponent %= self.order
+
+        mask = (1 << self.window) - 1
+        modulus = self.modulus
+        result = 1
+        for row in self.table:
+            if not exponent:
+                break
+            digit = exponent & mask
+            if digit:
+                result = result * row[digit] % modulus
+            exponent >>= self.window
+        return result
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def fixed_base(base, modulus, window=DEFAULT_WINDOW):
+    """Shared table for (base, modulus), built on first use"""
+    key = (base, modulus, window)
+    table = _tables.get(key)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(key)
+            if table is None:
+                table = FixedBaseTable(base, modulus, window)
+                _tables[key] = table
+    return table
+
+def fixed_pow(base, exponent, modulus):
+    """Drop-in for pow(base, exponent, modulus) when 'base' is a fixed generator"""
+    return fixed_base(base, modulus).pow(exponent)
@@ -3,10 +3,6 @@ import torch.nn as nn
 import torch.optim as optim
 import numpy as np
 import pandas as pd
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.linear_model import LinearRegression 
-from imblearn.over_sampling import SMOTE
 
 # --- 1. HYBRID DEEP LEARNING MODEL (LITE VERSION) ---
 # Optimized for Cloudflare Limits & Fast Convergence
@@ -50,6 +46,10 @@ def apply_ldp(data, epsilon=50.0):  # <--- CHANGED from 2.0 or 3.0 to 15.0
 
 # --- 3. PREPROCESSING PIPELINE ---
 def preprocess_data(df, n_components=6):
+    # sklearn/imblearn are slow to import; only data owners that train need them
+    from sklearn.preprocessing import MinMaxScaler
+    from imblearn.over_sampling import SMOTE
+
     df = df.fillna(0)
     
     # Handle Target Column (Ensure it's the last one)
@@ -59,6 +59,7 @@ def preprocess_data(df, n_components=6):
     # MANIPULATION 3: DISABLE PCA
     # PCA scrambles our synthetic pattern. Disabling it makes learning easy.
     # if X.shape[1] > n_components:
+    #     from sklearn.decomposition import PCA
     #     pca = PCA(n_components=n_components)
     #     X = pca.fit_transform(X)
     
@@ -92,4 +93,42 @@ def generate_dummy_data(rows=200):
     targets = targets.reshape(-1, 1)
     
     df = pd.DataFrame(np.hstack((data, targets)), columns=[f"feat_{i}" for i in range(9)] + ["outcome"])
-    return df
\ No newline at end of file
+    return df
+
+# --- 5. STREAMING FEDAVG ---
+class StreamingFedAvg:
+    """
+    Weighted FedAvg folded in one update at a time: a preallocated running
+    sum per parameter, updated in place, so memory stays O(model) no matter
+    how many owners reply and each payload can be dropped once it is added.
+    """
+    def __init__(self):
+        self.sums = None
+        self.total_samples = 0
+        self.updates = 0
+
+    def add(self, weights, num_samples):
+        """'weights' maps parameter name -> tensor (or nested list)"""
+        if num_samples <= 0:
+            raise ValueError("Update must cover at least one sample")
+        tensors = {k: torch.as_tensor(v, dtype=torch.float32) for k, v in weights.items()}
+
+        if self.sums is None:
+            self.sums = {k: torch.zeros_like(v) for k, v in tensors.items()}
+        if tensors.keys() != self.sums.keys():
+            raise ValueError("Update does not match the model's parameters")
+        for k, v in tensors.items():
+            if v.shape != self.sums[k].shape:
+                raise ValueError(f"Shape mismatch for {k}: {tuple(v.shape)}")
+
+        # Checked everything first so a bad update never half-applies
+        for k, v in tensors.items():
+            self.sums[k].add_(v, alpha=num_samples)
+        self.total_samples += num_samples
+        self.updates += 1
+
+    def result(self):
+        """Averaged weights (None if nothing was added)"""
+        if not self.total_samples:
+            return None
+        return {k: v / self.total_samples for k, v in self.sums.items()}
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import time
+import zlib
+from collections import defaultdict, deque
+import websockets
+from delivery import delivery_frame, fan_out, DELIVERED, STORED, DROPPED, EXPIRED, MAX_BROADCAST_RECIPIENTS
+
+# --- LOCAL RELAY (stand-in for ssi-cloud-relay's RelayHub) ---
+# Same protocol as the Cloudflare Durable Object:
+#     {"type": "register", "did": ...}              -> this socket is (also) that DID
+#     {"type": "unregister", "did": ...}            -> ... no longer
+#     {"type": ..., "from", "to", "payload": ...}   -> forwarded as-is to "to"
+#     {"type": ..., "from", "to_many", "payload"}   -> fanned out (delivery.py)
+# so every client works against it unchanged (SSI_RELAY_URL, see
+# relay_config.py). Differences, all for load testing on one box:
+#   * routing is sharded: a frame is queued to the worker task owning
+#     crc32(to) % shards, so one slow receiver only stalls its own shard
+#     while delivery order per DID is preserved
+#   * store-and-forward: frames for an offline DID wait in a bounded
+#     mailbox (MAILBOX_SIZE frames, MAILBOX_TTL seconds) and are flushed
+#     when it registers; senders get DELIVERY receipts (see delivery.py)
+#   * per-route metrics (messages, bytes, drops, queueing delay), logged
+#     periodically and returned for a {"type": "metrics"} frame
+#
+#     python local_relay.py --port 8765 --shards 8 --mailbox-ttl 600
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SHARDS = 8
+MAILBOX_SIZE = 256
+MAILBOX_TTL = 600
+METRICS_INTERVAL = 30
+SEND_TIMEOUT = 10  # A socket that takes longer to accept a frame is treated as dead
+PING_TIMEOUT = 60  # Generous: a client whose consumer is behind answers pings late
+
+class RouteStats:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.stored = 0
+        self.delay_total = 0.0
+
+    def as_dict(self):
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "stored": self.stored,
+            "avg_delay_ms": round(1000 * self.delay_total / self.delivered, 3) if self.delivered else None
+        }
+
+class Envelope:
+    """One routed frame on its way to 'target'"""
+    __slots__ = ("target", "raw", "route", "msg_id", "queued_at")
+
+    def __init__(self, target, raw, route, msg_id, queued_at):
+        self.target = target
+        self.raw = raw
+        self.route = route
+        self.msg_id = msg_id
+        self.queued_at = queued_at
+
+    @property
+    def sender(self):
+        return self.route[1]
+
+class LocalRelay:
+    def __init__(self, shards=DEFAULT_SHARDS, store_and_forward=True, mailbox_size=MAILBOX_SIZE, mailbox_ttl=MAILBOX_TTL):
+        self.sessions = {}  # DID -> websocket
+        self.shards = [asyncio.Queue() for _ in range(shards)]
+        self.store_and_forward = store_and_forward
+        self.mailbox_size = mailbox_size
+        self.mailbox_ttl = mailbox_ttl
+        self.mailboxes = defaultdict(deque) # DID -> deque of Envelope
+        self.routes = defaultdict(RouteStats) # (type, from, to) -> stats
+        self.started = time.time()
+
+    def _shard(self, did):
+        return self.shards[zlib.crc32(did.encode('utf-8')) % len(self.shards)]
+
+    async def handle(self, ws):
+        my_dids = set()
+        try:
+            async for raw in ws:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    print("[Relay] Error parsing message")
+                    continue
+
+                if data.get('type') == "register":
+                    did = data.get('did')
+                    if did:
+                        my_dids.add(did)
+                        self.sessions[did] = ws
+                        if self.mailboxes.get(did):
+                            # Flush through the shard so stored frames stay in order
+                            await self._shard(did).put(did)
+                    continue
+
+                if data.get('type') == "unregister":
+                    did = data.get('did')
+                    my_dids.discard(did)
+                    if self.sessions.get(did) is ws:
+                        del self.sessions[did]
+                    continue
+
+                if data.get('type') == "metrics":
+                    await ws.send(json.dumps({"type": "metrics", "payload": self.metrics()}))
+                    continue
+
+                if isinstance(data.get('to_many'), dict) and data.get('payload') is not None:
+                    if len(data['to_many']) > MAX_BROADCAST_RECIPIENTS:
+                        # One frame must not pin a shard for an unbounded fan-out
+                        route = (data.get('type'), data.get('from'), None)
+                        for target, msg_id in data['to_many'].items():
+                            await self._receipt(Envelope(target, None, route, msg_id, time.time()), DROPPED)
+                        continue
+                    for target, msg_id, frame in fan_out(data):
+                        await self._route(target, frame, data, msg_id)
+                    continue
+
+                if data.get('to') and data.get('payload') is not None:
+                    await self._route(data['to'], raw, data, data.get('msg_id'))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for did in my_dids:
+                if self.sessions.get(did) is ws:
+                    del self.sessions[did]
+
+    async def _route(self, target, raw, data, msg_id):
+        route = (data.get('type'), data.get('from'), target)
+        stats = self.routes[route]
+        stats.messages += 1
+        stats.bytes += len(raw)
+        await self._shard(target).put(Envelope(target, raw, route, msg_id, time.time()))
+
+    async def _worker(self, queue):
+        while True:
+            item = await queue.get()
+
+            if isinstance(item, str):
+                # Registration flush: deliver whatever waited in the mailbox
+                target = self.sessions.get(item)
+                for envelope in self.mailboxes.pop(item, ()):
+                    if self._expired(envelope):
+                        await self._receipt(envelope, EXPIRED)
+                    else:
+                        await self._deliver(target, envelope)
+                continue
+
+            envelope = item
+            target = self.sessions.get(envelope.target)
+            if target is None:
+                await self._store(envelope)
+                continue
+
+            await self._deliver(target, envelope)
+
+    def _expired(self, envelope):
+        return time.time() - envelope.queued_at > self.mailbox_ttl
+
+    async def _store(self, envelope):
+        stats = self.routes[envelope.route]
+        if not self.store_and_forward:
+            stats.dropped += 1
+            await self._receipt(envelope, DROPPED)
+            return
+
+        mailbox = self.mailboxes[envelope.target]
+        if len(mailbox) >= self.mailbox_size:
+            evicted = mailbox.popleft() # Oldest frame makes room
+            self.routes[evicted.route].dropped += 1
+            await self._receipt(evicted, DROPPED)
+        mailbox.append(envelope)
+        stats.stored += 1
+        await self._receipt(envelope, STORED)
+
+    async def _send(self, ws, raw):
+        """
+        Bounded send: a half-open peer whose buffer is full would otherwise
+        block this shard forever. On timeout the socket is dropped (its
+        DIDs go offline) and the caller treats the frame as not sent.
+        """
+        try:
+            await asyncio.wait_for(ws.send(raw), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            print("[Relay] ⚠️ Send timed out, dropping the connection")
+            for did in [d for d, s in self.sessions.items() if s is ws]:
+                del self.sessions[did]
+            asyncio.ensure_future(ws.close(1011, "send timeout"))
+            raise
+
+    async def _deliver(self, target, envelope):
+        stats = self.routes[envelope.route]
+        try:
+            await self._send(target, envelope.raw)
+        except Exception:
+            # Target went away (or stopped reading) mid-send: keep it for the next registration
+            await self._store(envelope)
+            return
+        stats.delivered += 1
+        stats.delay_total += time.time() - envelope.queued_at
+        await self._receipt(envelope, DELIVERED)
+
+    async def _receipt(self, envelope, status):
+        """DELIVERY frame back to the sender, if it asked (msg_id) and is online"""
+        sender = self.sessions.get(envelope.sender)
+        if not envelope.msg_id or sender is None:
+            return
+        try:
+            await self._send(sender, json.dumps(delivery_frame(envelope.target, envelope.sender, envelope.msg_id, status)))
+        except Exception:
+            pass
+
+    async def _expiry_loop(self, interval=30):
+        while True:
+            await asyncio.sleep(interval)
+            for did in list(self.mailboxes):
+                mailbox = self.mailboxes.get(did)
+                while mailbox and self._expired(mailbox[0]):
+                    await self._receipt(mailbox.popleft(), EXPIRED)
+                if not mailbox:
+                    self.mailboxes.pop(did, None)
+
+    def metrics(self):
+        routes = {f"{t}:{f}->{to}": stats.as_dict() for (t, f, to), stats in self.routes.items()}
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "connected_dids": len(self.sessions),
+            "queued": sum(q.qsize() for q in self.shards),
+            "mailboxed": sum(len(m) for m in self.mailboxes.values()),
+            "routes": routes
+        }
+
+    async def _metrics_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            m = self.metrics()
+            total = sum(r['messages'] for r in m['routes'].values())
+            dropped = sum(r['dropped'] for r in m['routes'].values())
+            print(f"[Relay] 📊 {m['connected_dids']} DIDs | {total} msgs | {dropped} dropped | "
+                  f"{m['queued']} queued | {m['mailboxed']} in mailboxes")
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, metrics_interval=METRICS_INTERVAL):
+        workers = [asyncio.create_task(self._worker(q)) for q in self.shards]
+        workers.append(asyncio.create_task(self._expiry_loop()))
+        if metrics_interval:
+            workers.append(asyncio.create_task(self._metrics_loop(metrics_interval)))
+        # Long ping timeout: a client whose consumer is behind stops reading
+        # (and answering pings) on purpose for a while; half-open ones still go
+        async with websockets.serve(self.handle, host, port, max_size=None, ping_interval=20, ping_timeout=PING_TIMEOUT):
+            print(f"[Relay] ✅ Listening on ws://{host}:{port} ({len(self.shards)} shards)")
+            await asyncio.Future() # Run until interrupted
+
+def main():
+    parser = argparse.ArgumentParser(description="Local asyncio relay for the SSI nodes")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--no-store-and-forward", action="store_true", help="drop frames for offline DIDs")
+    parser.add_argument("--mailbox-size", type=int, default=MAILBOX_SIZE)
+    parser.add_argument("--mailbox-ttl", type=int, default=MAILBOX_TTL)
+    parser.add_argument("--metrics-interval", type=int, default=METRICS_INTERVAL)
+    args = parser.parse_args()
+
+    async def run():
+        relay = LocalRelay(args.shards, not args.no_store_and_forward, args.mailbox_size, args.mailbox_ttl)
+        await relay.serve(args.host, args.port, args.metrics_interval)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n[Relay] Stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import mmap
+import os
+import struct
+from merkle_utils import BinaryMerkleTree
+
+# --- ON-DISK HBMT FORMAT ---
+# [32-byte header][level 0 digests][level 1 digests]...[root]
+# The body is exactly BinaryMerkleTree.buffer, so opening a store is an mmap
+# plus a header read: no leaf is rehashed and proofs are served from disk.
+MAGIC = b"HBMTREE1"
+VERSION = 1
+HEADER = struct.Struct("<8sHB5xQ8x") # magic, version, compat, leaf_count
+
+# Where the LG publishes its hospital allowlist (3_lg_node.py)
+HBMT_STORE = "hbmt_owner_tree.bin"
+
+class MerkleStore:
+    def __init__(self, path, file, mapping, tree):
+        self.path = path
+        self.file = file
+        self.mapping = mapping
+        self.tree = tree
+
+    @classmethod
+    def create(cls, path, tree):
+        """Writes a built BinaryMerkleTree to 'path' and opens it read-only"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, int(tree.compat), tree.leaf_count))
+            f.write(tree.buffer)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers never see a half-written tree
+        os.replace(tmp_path, path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path, writable=False):
+        """Maps an existing store. writable=True allows in-place update/revoke."""
+        f = open(path, 'r+b' if writable else 'rb')
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except ValueError:
+            f.close()
+            raise ValueError(f"{path} is empty, not a Merkle store")
+
+        try:
+            magic, version, compat, leaf_count = HEADER.unpack_from(mapping, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} Merkle store")
+            body = memoryview(mapping)[HEADER.size:]
+            tree = BinaryMerkleTree.from_buffer(body, leaf_count, bool(compat))
+        except (ValueError, struct.error):
+            mapping.close()
+            f.close()
+            raise
+
+        return cls(path, f, mapping, tree)
+
+    def get_root(self):
+        return self.tree.get_root()
+
+    def get_proof(self, leaf_data):
+        return self.tree.get_proof(leaf_data)
+
+    def flush(self):
+        """Pushes in-place updates (revoke/update) to disk"""
+        self.mapping.flush()
+
+    def close(self):
+        # Release our views of the mapping before closing it
+        self.tree.buffer.release()
+        self.tree = None
+        self.mapping.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_membership_proof(leaf_data, path=HBMT_STORE):
+    """Allowlist proof for 'leaf_data' from the LG's published store, if any"""
+    try:
+        with MerkleStore.open(path) as store:
+            return store.get_proof(leaf_data)
+    except (OSError, ValueError):
+        return None
@@ -1,4 +1,11 @@
+import binascii
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# Placeholder written over a revoked leaf. It has no known SHA256 preimage,
+# so no VC can ever produce a valid proof against it.
+REVOKED_LEAF = "0" * 64
 
 def hash_data(data_str):
     """Standard SHA256 Hash for Merkle Tree"""
@@ -9,6 +16,14 @@ class MerkleTree:
         self.leaves = [hash_data(l) for l in leaves]
         self.tree = [self.leaves]
         self._build_tree()
+        self._index_leaves()
+
+    def _index_leaves(self):
+        # Leaf hash -> position, so lookups don't scan the leaf list.
+        # The first occurrence wins, matching list.index().
+        self.leaf_index = {}
+        for i, leaf_hash in enumerate(self.leaves):
+            self.leaf_index.setdefault(leaf_hash, i)
 
     def _build_tree(self):
         current_level = self.leaves
@@ -26,13 +41,19 @@ class MerkleTree:
     def get_root(self):
         return self.tree[-1][0] if self.tree else None
 
+    def index_of(self, leaf_data):
+        """Position of a leaf in the tree, or None if it is not a member"""
+        return self.leaf_index.get(hash_data(leaf_data))
+
     def get_proof(self, leaf_data):
         """Generates the sibling path needed to prove a leaf exists"""
-        target_hash = hash_data(leaf_data)
-        if target_hash not in self.leaves:
+        index = self.index_of(leaf_data)
+        if index is None:
             return None
-        
-        index = self.leaves.index(target_hash)
+
+        return self._proof_at(index)
+
+    def _proof_at(self, index):
         proof = []
         
         for level in self.tree[:-1]: # Skip root layer
@@ -51,8 +72,132 @@ class MerkleTree:
             
         return proof
 
-def verify_merkle_proof(leaf_data, proof, root):
+    def get_proofs(self, leaves):
+        """Batch version of get_proof (None for leaves that are not members)"""
+        proofs = []
+        for leaf_data in leaves:
+            index = self.index_of(leaf_data)
+            proofs.append(None if index is None else self._proof_at(index))
+        return proofs
+
+    def get_all_proofs(self):
+        """
+        Emits the proof of every leaf (in leaf order) in a single pass over
+        the tree. Each sibling entry is built once and shared by all the
+        leaves under it, so the cost is the size of the output.
+        """
+        proofs = [[] for _ in self.leaves]
+
+        for depth, level in enumerate(self.tree[:-1]): # Skip root layer
+            for index in range(len(level)):
+                is_right_node = index % 2 == 1
+                sibling_index = index - 1 if is_right_node else index + 1
+                if sibling_index >= len(level):
+                    sibling_index = index
+
+                entry = {
+                    "sibling": level[sibling_index],
+                    "direction": "left" if is_right_node else "right"
+                }
+                first = index << depth
+                last = min((index + 1) << depth, len(self.leaves))
+                for leaf in range(first, last):
+                    proofs[leaf].append(entry)
+
+        return proofs
+
+    def get_multiproof(self, leaves):
+        """One deduplicated proof for several leaves (see build_multiproof)"""
+        indices = [self.index_of(leaf_data) for leaf_data in leaves]
+        if None in indices:
+            return None
+        return build_multiproof(indices, [len(level) for level in self.tree],
+                                lambda level, index: self.tree[level][index])
+
+    # --- INCREMENTAL UPDATES ---
+    # Each mutation rehashes only the path from one leaf to the root and
+    # returns the (level, index) of every node it rewrote.
+
+    def append(self, leaf_data):
+        """Adds a new leaf at the end of the tree"""
+        leaf_hash = hash_data(leaf_data)
+        self.leaves.append(leaf_hash)
+        self.leaf_index.setdefault(leaf_hash, len(self.leaves) - 1)
+        return self._rehash_path(len(self.leaves) - 1)
+
+    def update(self, index, leaf_data):
+        """Replaces the leaf at 'index' (e.g. a re-issued VC)"""
+        leaf_hash = hash_data(leaf_data)
+        self._unindex(index)
+        self.leaves[index] = leaf_hash
+        self.leaf_index.setdefault(leaf_hash, index)
+        return self._rehash_path(index)
+
+    def revoke(self, index):
+        """
+        Blanks the leaf at 'index' instead of removing it, so every other
+        leaf keeps its position and the tree never has to be rebuilt.
+        """
+        self._unindex(index)
+        self.leaves[index] = REVOKED_LEAF
+        return self._rehash_path(index)
+
+    def _unindex(self, index):
+        if self.leaf_index.get(self.leaves[index]) == index:
+            del self.leaf_index[self.leaves[index]]
+
+    def _rehash_path(self, index):
+        changed = [(0, index)]
+        level = 0
+        while len(self.tree[level]) > 1:
+            nodes = self.tree[level]
+            left_index = index - (index % 2)
+            left = nodes[left_index]
+            # Same odd-node rule as _build_tree: duplicate the last one
+            right = nodes[left_index+1] if left_index+1 < len(nodes) else left
+            parent = hash_data(left + right)
+
+            index //= 2
+            level += 1
+            if level == len(self.tree):
+                self.tree.append([]) # Tree grew by one level
+
+            upper = self.tree[level]
+            if index < len(upper):
+                upper[index] = parent
+            else:
+                upper.append(parent)
+            changed.append((level, index))
+
+        return changed
+
+    def stale_leaves(self, changed):
+        """
+        Lists the leaf indices whose stored proof contains one of the
+        'changed' nodes, i.e. the only proofs that must be re-issued.
+        """
+        stale = set()
+        for level, index in changed:
+            if level >= len(self.tree) - 1:
+                continue # The root never appears inside a proof
+
+            # A node is read by its pair, or by itself when it is the
+            # duplicated last node of an odd level.
+            reader = index ^ 1
+            if reader >= len(self.tree[level]):
+                reader = index
+
+            first = reader << level
+            last = min((reader + 1) << level, len(self.leaves))
+            stale.update(range(first, last))
+
+        return sorted(stale)
+
+def verify_merkle_proof(leaf_data, proof, root, compat=True):
     """Reconstructs the root from the leaf + proof and checks against expected root"""
+    if not compat:
+        return _verify_binary_proof(leaf_data, proof, root)
+
     current_hash = hash_data(leaf_data)
     
     for node in proof:
@@ -63,4 +208,409 @@ def verify_merkle_proof(leaf_data, proof, root):
             combined = sibling + current_hash
         current_hash = hash_data(combined)
         
-    return current_hash == root
\ No newline at end of file
+    return current_hash == root
+
+def _verify_binary_proof(leaf_data, proof, root):
+    """verify_merkle_proof for roots built with BinaryMerkleTree(compat=False)"""
+    current = hashlib.sha256(leaf_data.encode('utf-8')).digest()
+
+    for node in proof:
+        sibling = bytes.fromhex(node['sibling'])
+        if node['direction'] == "right":
+            combined = current + sibling
+        else:
+            combined = sibling + current
+        current = hashlib.sha256(combined).digest()
+
+    return current.hex() == root
+
+# --- BINARY ENGINE ---
+# Same tree shape as MerkleTree, but every node is a raw 32-byte digest kept
+# in ONE contiguous bytearray (level 0 first, root last). Hex only appears
+# at the API boundary (roots and proofs), so the on-chain format is unchanged.
+#
+# compat=True  -> parents are sha256(hex(left) + hex(right)), i.e. exactly the
+#                 roots MerkleTree produces and publishMerkleRoot already holds.
+# compat=False -> parents are sha256(left || right) over raw bytes: half the
+#                 bytes hashed. Roots differ, verify with compat=False.
+
+DIGEST_SIZE = 32
+BUILD_BLOCK = 4096 # Nodes hashed per batch while building
+PARALLEL_BLOCK = 1 << 15 # Leaves per worker task in parallel builds (power of two)
+
+def _level_sizes(leaf_count):
+    sizes = [leaf_count]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+def _build_block(leaves, compat, height):
+    """Parallel build worker: packed levels 0..height of one block of leaves"""
+    block = BinaryMerkleTree(leaves, compat)
+    levels = [bytes(block.buffer[offset:offset + size*DIGEST_SIZE])
+              for offset, size in zip(block.level_offsets, block.level_sizes)]
+
+    # A short last block stops at its own root, but in the full tree that
+    # root is the last node of its level and keeps being paired with itself
+    while len(levels) <= height:
+        levels.append(block._hash_children(levels[-1]))
+    return levels
+
+class BinaryMerkleTree:
+    def __init__(self, leaves, compat=True, workers=None):
+        self.compat = compat
+        self._layout(len(leaves))
+        self._leaf_index = None
+
+        # workers > 1: hash aligned blocks of leaves on a process pool, then
+        # finish the few levels above them here. Same root as the serial build.
+        if workers and workers > 1 and len(leaves) > PARALLEL_BLOCK:
+            self._build_parallel(leaves, workers)
+            return
+
+        self._hash_leaves(leaves, 0)
+        self._build_tree()
+
+    def _hash_leaves(self, leaves, first):
+        # Level 0: leaf digests written straight into the buffer, a block
+        # at a time so no per-leaf objects outlive their block
+        sha256 = hashlib.sha256
+        for start in range(0, len(leaves), BUILD_BLOCK):
+            block = leaves[start:start + BUILD_BLOCK]
+            offset = (first + start) * DIGEST_SIZE
+            self.buffer[offset:offset + len(block)*DIGEST_SIZE] = b"".join(
+                [sha256(leaf.encode('utf-8')).digest() for leaf in block])
+
+    def _build_parallel(self, leaves, workers):
+        # PARALLEL_BLOCK is a power of two, so every block covers whole
+        # subtrees and its levels land at fixed offsets in the global levels
+        block_height = PARALLEL_BLOCK.bit_length() - 1
+        starts = range(0, len(leaves), PARALLEL_BLOCK)
+        blocks = [leaves[start:start + PARALLEL_BLOCK] for start in starts]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_build_block, blocks, repeat(self.compat), repeat(block_height))
+            for start, levels in zip(starts, results):
+                for level, packed in enumerate(levels):
+                    offset = self.level_offsets[level] + (start >> level)*DIGEST_SIZE
+                    self.buffer[offset:offset + len(packed)] = packed
+
+        self._build_tree(block_height)
+
+    @classmethod
+    def from_buffer(cls, buffer, leaf_count, compat=True):
+        """Wraps an already-built level buffer (e.g. an mmap) without rehashing"""
+        tree = cls.__new__(cls)
+        tree.compat = compat
+        tree._layout(leaf_count, buffer)
+        tree._leaf_index = None
+        return tree
+
+    def _layout(self, leaf_count, buffer=None):
+        self.leaf_count = leaf_count
+        self.level_sizes = _level_sizes(leaf_count)
+        self.level_offsets = []
+        offset = 0
+        for size in self.level_sizes:
+            self.level_offsets.append(offset)
+            offset += size * DIGEST_SIZE
+
+        if buffer is None:
+            buffer = bytearray(offset)
+        elif len(buffer) != offset:
+            raise ValueError(f"Buffer holds {len(buffer)} bytes, a {leaf_count}-leaf tree needs {offset}")
+        self.buffer = buffer
+
+    def _hash_pair(self, pair):
+        if self.compat:
+            return hashlib.sha256(binascii.hexlify(pair)).digest()
+        return hashlib.sha256(pair).digest()
+
+    def _build_tree(self, first_level=0):
+        for level in range(first_level, len(self.level_sizes) - 1):
+            child = self.level_offsets[level]
+            child_end = child + self.level_sizes[level]*DIGEST_SIZE
+            parent = self.level_offsets[level + 1]
+
+            # BUILD_BLOCK is even, so blocks never split a pair
+            for start in range(child, child_end, BUILD_BLOCK*DIGEST_SIZE):
+                children = bytes(self.buffer[start:min(start + BUILD_BLOCK*DIGEST_SIZE, child_end)])
+                parents = self._hash_children(children)
+                self.buffer[parent:parent + len(parents)] = parents
+                parent += len(parents)
+
+    def _hash_children(self, children):
+        """Hashes a packed level of digests into its packed parent level"""
+        if len(children) % (2*DIGEST_SIZE):
+            # If odd number of nodes, duplicate the last one
+            children += children[-DIGEST_SIZE:]
+
+        sha256 = hashlib.sha256
+        pairs = range(0, len(children), 2*DIGEST_SIZE)
+        if self.compat:
+            hexed = binascii.hexlify(children) # hex(left) + hex(right) for every pair at once
+            return b"".join([sha256(hexed[2*i:2*i + 4*DIGEST_SIZE]).digest() for i in pairs])
+        return b"".join([sha256(children[i:i + 2*DIGEST_SIZE]).digest() for i in pairs])
+
+    def _hash_level(self, view, level, first, last):
+        """Writes parents [first, last) of 'level' into the level above"""
+        size = self.level_sizes[level]
+        child = self.level_offsets[level]
+        parent = self.level_offsets[level + 1]
+        hash_pair = self._hash_pair
+
+        for i in range(first, last):
+            left = child + 2*i*DIGEST_SIZE
+            if 2*i + 1 < size:
+                pair = view[left:left + 2*DIGEST_SIZE]
+            else:
+                # If odd number of nodes, duplicate the last one
+                pair = bytes(view[left:left + DIGEST_SIZE]) * 2
+            view[parent + i*DIGEST_SIZE:parent + (i+1)*DIGEST_SIZE] = hash_pair(pair)
+
+    def _node(self, level, index):
+        offset = self.level_offsets[level] + index*DIGEST_SIZE
+        return bytes(self.buffer[offset:offset + DIGEST_SIZE])
+
+    def get_root(self):
+        if self.leaf_count == 0:
+            return None
+        return self._node(len(self.level_sizes) - 1, 0).hex()
+
+    @property
+    def leaf_index(self):
+        # Digest -> position, built on first lookup (first occurrence wins)
+        if self._leaf_index is None:
+            self._leaf_index = {}
+            for i in range(self.leaf_count):
+                self._leaf_index.setdefault(self._node(0, i), i)
+        return self._leaf_index
+
+    def index_of(self, leaf_data):
+        """Position of a leaf in the tree, or None if it is not a member"""
+        return self.leaf_index.get(hashlib.sha256(leaf_data.encode('utf-8')).digest())
+
+    def get_proof(self, leaf_data):
+        """Generates the sibling path needed to prove a leaf exists"""
+        index = self.index_of(leaf_data)
+        if index is None:
+            return None
+
+        return self._proof_at(index)
+
+    def _proof_at(self, index):
+        proof = []
+        for level, size in enumerate(self.level_sizes[:-1]): # Skip root layer
+            is_right_node = index % 2 == 1
+            sibling_index = index - 1 if is_right_node else index + 1
+            if sibling_index >= size:
+                sibling_index = index
+
+            proof.append({
+                "sibling": self._node(level, sibling_index).hex(),
+                "direction": "left" if is_right_node else "right"
+            })
+            index //= 2
+
+        return proof
+
+    def get_proofs(self, leaves):
+        """Batch version of get_proof (None for leaves that are not members)"""
+        proofs = []
+        for leaf_data in leaves:
+            index = self.index_of(leaf_data)
+            proofs.append(None if index is None else self._proof_at(index))
+        return proofs
+
+    def get_all_proofs(self):
+        """Proof of every leaf in leaf order, in one pass (see MerkleTree)"""
+        proofs = [[] for _ in range(self.leaf_count)]
+
+        for depth, size in enumerate(self.level_sizes[:-1]): # Skip root layer
+            for index in range(size):
+                is_right_node = index % 2 == 1
+                sibling_index = index - 1 if is_right_node else index + 1
+                if sibling_index >= size:
+                    sibling_index = index
+
+                entry = {
+                    "sibling": self._node(depth, sibling_index).hex(),
+                    "direction": "left" if is_right_node else "right"
+                }
+                first = index << depth
+                last = min((index + 1) << depth, self.leaf_count)
+                for leaf in range(first, last):
+                    proofs[leaf].append(entry)
+
+        return proofs
+
+    def get_multiproof(self, leaves):
+        """One deduplicated proof for several leaves (see build_multiproof)"""
+        indices = [self.index_of(leaf_data) for leaf_data in leaves]
+        if None in indices:
+            return None
+        return build_multiproof(indices, self.level_sizes,
+                                lambda level, index: self._node(level, index).hex())
+
+    # --- INCREMENTAL UPDATES (in place; the layout is fixed at build time) ---
+
+    def update(self, index, leaf_data):
+        """Replaces the leaf at 'index' (e.g. a re-issued VC)"""
+        return self._set_leaf(index, hashlib.sha256(leaf_data.encode('utf-8')).digest())
+
+    def revoke(self, index):
+        """Blanks the leaf at 'index' (see MerkleTree.revoke)"""
+        return self._set_leaf(index, bytes.fromhex(REVOKED_LEAF))
+
+    def _set_leaf(self, index, digest):
+        if self._leaf_index is not None:
+            old = self._node(0, index)
+            if self._leaf_index.get(old) == index:
+                del self._leaf_index[old]
+            if digest != bytes.fromhex(REVOKED_LEAF):
+                self._leaf_index.setdefault(digest, index)
+
+        view = memoryview(self.buffer)
+        offset = index*DIGEST_SIZE
+        view[offset:offset + DIGEST_SIZE] = digest
+
+        changed = [(0, index)]
+        for level in range(len(self.level_sizes) - 1):
+            index //= 2
+            self._hash_level(view, level, index, index + 1)
+            changed.append((level + 1, index))
+        return changed
+
+    def stale_leaves(self, changed):
+        """Leaf indices whose stored proof contains one of the 'changed' nodes"""
+        stale = set()
+        for level, index in changed:
+            if level >= len(self.level_sizes) - 1:
+                continue # The root never appears inside a proof
+
+            reader = index ^ 1
+            if reader >= self.level_sizes[level]:
+                reader = index
+
+            first = reader << level
+            last = min((reader + 1) << level, self.leaf_count)
+            stale.update(range(first, last))
+
+        return sorted(stale)
+
+
+# --- MULTIPROOFS ---
+# A multiproof proves k leaves against one root. Siblings shared by several
+# leaves are listed once, and nodes the verifier can compute itself are left
+# out. Format:
+#   {"height": h, "indices": [leaf positions],
+#    "siblings": [{"level": l, "index": i, "hash": hex}, ...]}
+# A duplicated last node (odd level) is sent explicitly as its own sibling,
+# so the verifier never needs to know the leaf count.
+
+def build_multiproof(indices, level_sizes, node_hex):
+    """Builds a multiproof from a tree's level sizes and a node accessor"""
+    siblings = []
+    known = set(indices)
+
+    for level, size in enumerate(level_sizes[:-1]): # Skip root layer
+        for index in sorted(known):
+            sibling_index = index ^ 1
+            if sibling_index in known:
+                continue
+            source = sibling_index if sibling_index < size else index
+            siblings.append({"level": level, "index": sibling_index, "hash": node_hex(level, source)})
+        known = {index // 2 for index in known}
+
+    return {"height": len(level_sizes) - 1, "indices": list(indices), "siblings": siblings}
+
+def _proof_index(proof):
+    # A sibling on the left means we were the right node at that level
+    index = 0
+    for level, node in enumerate(proof):
+        if node['direction'] == "left":
+            index |= 1 << level
+    return index
+
+def merge_proofs(proofs):
+    """
+    Folds single-leaf proofs (e.g. the ones owners attach to M2) into one
+    multiproof, dropping duplicate siblings and siblings the verifier will
+    compute anyway. Returns None if the proofs come from different trees
+    or any of them is malformed.
+    """
+    try:
+        if not proofs or len({len(proof) for proof in proofs}) != 1:
+            return None
+
+        height = len(proofs[0])
+        indices = [_proof_index(proof) for proof in proofs]
+        computed = set()
+        for index in indices:
+            computed.update((level, index >> level) for level in range(height))
+
+        siblings = {}
+        for index, proof in zip(indices, proofs):
+            for level, node in enumerate(proof):
+                key = (level, (index >> level) ^ 1)
+                if key not in computed and key not in siblings:
+                    siblings[key] = node['sibling']
+    except (KeyError, TypeError, AttributeError):
+        return None # e.g. a proof that is not a list of {direction, sibling}
+
+    return {
+        "height": height,
+        "indices": indices,
+        "siblings": [{"level": l, "index": i, "hash": h} for (l, i), h in sorted(siblings.items())]
+    }
+
+def verify_merkle_multiproof(leaves, multiproof, root, compat=True):
+    """
+    Checks k leaves against one root. Every internal node on the union of
+    their paths is hashed exactly once.
+    """
+    try:
+        indices = multiproof['indices']
+        height = multiproof['height']
+        if len(indices) != len(leaves) or not leaves:
+            return False
+
+        if compat:
+            parent_of = lambda left, right: hash_data(left + right)
+            known = {}
+            for leaf_data, index in zip(leaves, indices):
+                leaf_hash = hash_data(leaf_data)
+                if known.setdefault(index, leaf_hash) != leaf_hash:
+                    return False # Two different leaves claim one position
+        else:
+            parent_of = lambda left, right: hashlib.sha256(left + right).digest()
+            known = {}
+            for leaf_data, index in zip(leaves, indices):
+                leaf_hash = hashlib.sha256(leaf_data.encode('utf-8')).digest()
+                if known.setdefault(index, leaf_hash) != leaf_hash:
+                    return False
+
+        provided = {}
+        for node in multiproof['siblings']:
+            value = node['hash'] if compat else bytes.fromhex(node['hash'])
+            provided[(node['level'], node['index'])] = value
+
+        for level in range(height):
+            parents = {}
+            for index in known:
+                parent = index // 2
+                if parent in parents:
+                    continue
+                left = known.get(2*parent, provided.get((level, 2*parent)))
+                right = known.get(2*parent + 1, provided.get((level, 2*parent + 1)))
+                if left is None or right is None:
+                    return False
+                parents[parent] = parent_of(left, right)
+            known = parents
+
+        if list(known) != [0]:
+            return False
+        result = known[0] if compat else known[0].hex()
+        return result == root
+    except (KeyError, TypeError, ValueError):
+        return False
@@ -0,0 +1,98 @@
+import asyncio
+import inspect
+import json
+import zlib
+from async_cloud_client import AsyncCloudAgentClient, Inbox, QUEUE_SIZE
+
+# --- MULTIPLEXED CLOUD CLIENT ---
+# One WebSocket, many DIDs. Every hosted DID is registered on the same
+# connection (the relay keeps a set of DIDs per socket), and inbound frames
+# are routed by their "to" field to that DID's handler. Handlers run on a
+# fixed pool of worker tasks, sharded by crc32(did) like the local relay,
+# so per-DID order is kept and one process can host thousands of virtual
+# owners without a socket or thread each.
+#
+#     mux = MultiplexCloudClient()
+#     owner = mux.add_agent(owner_did, on_message)   # handler(agent, msg), sync or async
+#     await mux.connect()
+#     await owner.send(analyst_did, "M2", payload)
+
+DEFAULT_WORKERS = 8
+
+class VirtualAgent:
+    """One DID hosted on a MultiplexCloudClient (same send API as the single-DID client)"""
+    def __init__(self, client, did, handler):
+        self.client = client
+        self.did = did
+        self.handler = handler
+
+    async def send(self, target_did, msg_type, payload, attempts=3, timeout=10):
+        return await self.client._send_as(self.did, target_did, msg_type, payload, attempts, timeout)
+
+    async def broadcast(self, target_dids, msg_type, payload, timeout=10):
+        return await self.client._broadcast_as(self.did, target_dids, msg_type, payload, timeout)
+
+    def delivery_status(self, msg_id):
+        return self.client.delivery.status(msg_id)
+
+class MultiplexCloudClient(AsyncCloudAgentClient):
+    def __init__(self, url=None, queue_size=QUEUE_SIZE, workers=DEFAULT_WORKERS, name="mux"):
+        super().__init__(name, url, queue_size)
+        self.agents = {} # DID -> VirtualAgent
+        self.inboxes = [Inbox(queue_size) for _ in range(workers)]
+
+    def add_agent(self, did, handler=None):
+        """Hosts 'did' on this connection; registered right away if already connected"""
+        agent = VirtualAgent(self, did, handler)
+        self.agents[did] = agent
+        if self.connected.is_set():
+            asyncio.ensure_future(self._register_dids([did]))
+        return agent
+
+    async def remove_agent(self, did):
+        if self.agents.pop(did, None) and self.connected.is_set():
+            await self._send_frame({"type": "unregister", "did": did})
+
+    async def connect(self, timeout=5):
+        started = self.running
+        await super().connect(timeout)
+        if not started:
+            self._tasks += [asyncio.create_task(self._worker(q)) for q in self.inboxes]
+
+    async def _register(self):
+        await self._register_dids(list(self.agents))
+
+    async def _register_dids(self, dids):
+        try:
+            for did in dids:
+                async with self.send_lock:
+                    await self.ws.send(json.dumps({"type": "register", "did": did}))
+        except Exception as e:
+            # The reconnect registers every agent again
+            print(f"[{self.did}] ⚠️ Registration Failed: {e}")
+
+    def _reader_stalls(self):
+        return sum(i.stalls for i in self.inboxes), any(i.blocked for i in self.inboxes)
+
+    async def _enqueue(self, data):
+        # Same backpressure as the single-DID client, per worker shard
+        did = data.get('to') or ""
+        await self.inboxes[zlib.crc32(did.encode('utf-8')) % len(self.inboxes)].put(data)
+
+    async def _worker(self, inbox):
+        while True:
+            msg = await inbox.get()
+            agent = self.agents.get(msg.get('to'))
+            if agent is None:
+                print(f"[{self.did}] ⚠️ No agent for {msg.get('to')}, dropping {msg.get('type')}")
+                continue
+            if agent.handler is None:
+                continue
+            try:
+                result = agent.handler(agent, msg)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"[{agent.did}] ⚠️ Handler Error: {e}")
+                continue
+            await self._taken(msg)
@@ -1,9 +1,12 @@
 import hashlib
 import secrets
+import secp256k1
+from fixed_base import fixed_pow
 
 # --- NIZKP CONSTANTS (Schnorr Group) ---
-# In a real production system, use standard curves like secp256k1 or Curve25519.
-# For this implementation, we use a Safe Prime group for clear, readable ZK math.
+# In a real production system, use standard curves like secp256k1 or Curve25519
+# (available below as SECP256K1_GROUP). The default is a Safe Prime group for
+# clear, readable ZK math.
 # (RFC 3526 - 2048 bit MODP Group ID 14 simplified for simulation speed)
 PRIME_MODULUS = int('FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1'
                     '29024E088A67CC74020BBEA63B139B22514A08798E3404DD'
@@ -18,55 +21,243 @@ PRIME_MODULUS = int('FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1'
                     '15728E5A8AACAA68FFFFFFFFFFFFFFFF', 16)
 GENERATOR = 2
 
+# Random batch weights are this many bits: a bad proof slips through a
+# batch check with probability about 2^-BATCH_SECURITY_BITS.
+BATCH_SECURITY_BITS = 128
+
+def multi_exp(pairs, modulus, window=4):
+    """
+    prod(base^exp) mod modulus for many (base, exp) pairs, sharing ONE chain
+    of squarings between all of them (Straus' interleaved windows). Costs
+    about max_bits squarings plus max_bits/window multiplies per base,
+    instead of a full exponentiation per base.
+    """
+    pairs = [(base % modulus, exp) for base, exp in pairs if exp]
+    if not pairs:
+        return 1 % modulus
+
+    size = 1 << window
+    tables = []
+    for base, _ in pairs:
+        row = [1, base]
+        for _ in range(size - 2):
+            row.append(row[-1] * base % modulus)
+        tables.append(row)
+
+    max_bits = max(exp.bit_length() for _, exp in pairs)
+    result = 1
+    for shift in range(((max_bits - 1) // window) * window, -1, -window):
+        if result != 1:
+            for _ in range(window):
+                result = result * result % modulus
+        for (_, exp), row in zip(pairs, tables):
+            digit = (exp >> shift) & (size - 1)
+            if digit:
+                result = result * row[digit] % modulus
+    return result
+
+def batch_check(equations, generator, modulus, order):
+    """
+    Small-exponent batch test for Schnorr equations g^s == t * y^c.
+    'equations' is a list of (t, s, y, c). With random weights a_i it checks
+        g^(sum a_i*s_i) == prod t_i^a_i * y_i^(a_i*c_i)
+    i.e. one fixed-base exponentiation plus one multi-exponentiation.
+    Returns False if ANY equation is wrong (w.h.p.); callers then fall back
+    to individual checks to find which one.
+    """
+    s_sum = 0
+    pairs = []
+    for t, s, y, c in equations:
+        if not (0 < t < modulus and 0 < y < modulus):
+            return False
+        a = secrets.randbits(BATCH_SECURITY_BITS) | 1
+        s_sum += a * s
+        pairs.append((t, a))
+        pairs.append((y, a * c))
+
+    lhs = fixed_pow(generator, s_sum % order, modulus)
+    return lhs == multi_exp(pairs, modulus)
+
+# --- GROUP BACKENDS ---
+# Schnorr only needs a prime-order-ish group with a generator. Both backends
+# expose the same small interface, so the protocol code never touches the
+# group arithmetic directly:
+#   base_exp(k) = g^k      exp(a, k) = a^k      mul(a, b) = a*b
+#   encode/decode          -> hex strings for JSON / the on-chain registry
+#   to_str                 -> how an element is written into a challenge hash
+#   batch_check(equations) -> see batch_check() above
+
+class ModpGroup:
+    """Multiplicative group modulo a safe prime (the original backend)"""
+    name = "modp"
+
+    def __init__(self, modulus, generator=GENERATOR):
+        self.modulus = modulus
+        self.generator = generator
+        # Exponents are reduced mod (p - 1), as the original code did
+        self.order = modulus - 1
+
+    def random_scalar(self):
+        return secrets.randbelow(self.order)
+
+    def base_exp(self, k):
+        return fixed_pow(self.generator, k, self.modulus)
+
+    def exp(self, element, k):
+        return pow(element, k, self.modulus)
+
+    def mul(self, a, b):
+        return a * b % self.modulus
+
+    def encode(self, element):
+        return hex(element)
+
+    def decode(self, text):
+        element = int(text, 16)
+        if not 0 < element < self.modulus:
+            raise ValueError("Group element out of range")
+        return element
+
+    def to_str(self, element):
+        return str(element)
+
+    def batch_check(self, equations):
+        return batch_check(equations, self.generator, self.modulus, self.order)
+
+class Secp256k1Group:
+    """
+    Schnorr over secp256k1, the curve eth_account keys already use: an
+    Ethereum private key is directly a valid secret, and its ZK public key is
+    the account's own public key. Elements travel as 33-byte compressed
+    points instead of 256-byte integers.
+    """
+    name = "secp256k1"
+    order = secp256k1.N
+    generator = secp256k1.G
+
+    def random_scalar(self):
+        return secrets.randbelow(self.order - 1) + 1
+
+    def base_exp(self, k):
+        return secp256k1.base_mul(k)
+
+    def exp(self, element, k):
+        return secp256k1.point_mul(k, element)
+
+    def mul(self, a, b):
+        return secp256k1.point_add(a, b)
+
+    def encode(self, element):
+        return "0x" + secp256k1.encode_point(element).hex()
+
+    def decode(self, text):
+        if text.startswith("0x"):
+            text = text[2:]
+        return secp256k1.decode_point(bytes.fromhex(text))
+
+    def to_str(self, element):
+        return secp256k1.encode_point(element).hex()
+
+    def batch_check(self, equations):
+        # Same small-exponent test as batch_check(), written additively:
+        # (sum a_i*s_i) * G == sum a_i*T_i + (a_i*c_i)*Y_i
+        s_sum = 0
+        pairs = []
+        for t, s, y, c in equations:
+            a = secrets.randbits(BATCH_SECURITY_BITS) | 1
+            s_sum += a * s
+            pairs.append((a, t))
+            pairs.append((a * c, y))
+        return secp256k1.base_mul(s_sum) == secp256k1.multi_mul(pairs)
+
+MODP_GROUP = ModpGroup(PRIME_MODULUS, GENERATOR)
+SECP256K1_GROUP = Secp256k1Group()
+
 class SchnorrNIZKP:
     """
     Implements Non-Interactive Zero-Knowledge Proof (NIZKP)
     Protocol: Schnorr Identification with Fiat-Shamir Transform
+    Every method takes an optional 'group' backend (default: MODP_GROUP);
+    public keys are elements of that group.
     """
 
     @staticmethod
-    def generate_proof(private_key_int, public_key_int, message):
+    def _challenge(group, public_key, t, message):
+        challenge_input = f"{group.to_str(group.generator)}{group.to_str(public_key)}{group.to_str(t)}{message}"
+        return int(hashlib.sha256(challenge_input.encode()).hexdigest(), 16)
+
+    @staticmethod
+    def generate_proof(private_key_int, public_key_int, message, group=MODP_GROUP):
         """
         Prover generates a proof: (Commitment, Response)
         Proves knowledge of 'x' in y = g^x without revealing 'x'.
         """
         # 1. Commitment: r = random, t = g^r
-        r = secrets.randbelow(PRIME_MODULUS - 1)
-        t = pow(GENERATOR, r, PRIME_MODULUS)
+        r = group.random_scalar()
+        t = group.base_exp(r)
 
         # 2. Challenge: c = H(g, y, t, message) (Fiat-Shamir)
         # We bind the proof to a specific message (e.g., connection request ID)
-        challenge_input = f"{GENERATOR}{public_key_int}{t}{message}"
-        c = int(hashlib.sha256(challenge_input.encode()).hexdigest(), 16)
+        c = SchnorrNIZKP._challenge(group, public_key_int, t, message)
 
         # 3. Response: s = r + c * x
-        # Note: We compute modulo (PRIME_MODULUS - 1) for the exponent
-        s = (r + c * private_key_int) % (PRIME_MODULUS - 1)
+        # Note: We compute modulo the group order for the exponent
+        s = (r + c * private_key_int) % group.order
 
         return {
-            "t": hex(t),
+            "t": group.encode(t),
             "s": hex(s),
             "c": hex(c) # Included for easier debugging, but Verifier recalculates it
         }
 
     @staticmethod
-    def verify_proof(public_key_int, message, proof):
+    def verify_proof(public_key_int, message, proof, group=MODP_GROUP):
         """
         Verifier checks the proof.
         Equation: g^s == t * y^c
         """
-        t = int(proof['t'], 16)
+        t = group.decode(proof['t'])
         s = int(proof['s'], 16)
         
         # 1. Recompute Challenge: c = H(g, y, t, message)
-        challenge_input = f"{GENERATOR}{public_key_int}{t}{message}"
-        c_recalc = int(hashlib.sha256(challenge_input.encode()).hexdigest(), 16)
+        c_recalc = SchnorrNIZKP._challenge(group, public_key_int, t, message)
 
         # 2. Verify Equation
         # Left Hand Side: g^s
-        lhs = pow(GENERATOR, s, PRIME_MODULUS)
+        lhs = group.base_exp(s)
         
         # Right Hand Side: t * y^c
-        rhs = (t * pow(public_key_int, c_recalc, PRIME_MODULUS)) % PRIME_MODULUS
+        rhs = group.mul(t, group.exp(public_key_int, c_recalc))
+
+        return lhs == rhs
+
+    @staticmethod
+    def verify_batch(items, group=MODP_GROUP):
+        """
+        Verifies many proofs at once. 'items' is a list of
+        (public_key_int, message, proof); returns one bool per item.
+        If the batch check fails, every proof is re-checked on its own so
+        only the offenders are rejected.
+        """
+        results = [False] * len(items)
+        equations = []
+        indices = []
+        for i, (public_key_int, message, proof) in enumerate(items):
+            try:
+                t = group.decode(proof['t'])
+                s = int(proof['s'], 16)
+            except (KeyError, TypeError, ValueError):
+                continue # Malformed proof: rejected outright
+            c = SchnorrNIZKP._challenge(group, public_key_int, t, message)
+            equations.append((t, s, public_key_int, c))
+            indices.append(i)
+
+        if equations and group.batch_check(equations):
+            for i in indices:
+                results[i] = True
+            return results
 
-        return lhs == rhs
\ No newline at end of file
+        for i in indices:
+            public_key_int, message, proof = items[i]
+            results[i] = SchnorrNIZKP.verify_proof(public_key_int, message, proof, group)
+        return results
@@ -0,0 +1,25 @@
+import json
+import os
+
+# --- RELAY ENDPOINT ---
+# Nodes talk to the Cloudflare RelayHub by default. For offline load tests
+# point them at local_relay.py instead, either per process
+#     SSI_RELAY_URL=ws://127.0.0.1:8765 python 5_owner_node.py 1
+# or for every node with "relay_url" in system_config.json.
+
+DEFAULT_RELAY_URL = "wss://ssi-cloud-relay.becse2026fypp1-tno-20.workers.dev"
+
+def resolve_relay_url(url=None):
+    """Explicit url > $SSI_RELAY_URL > system_config.json "relay_url" > Cloudflare"""
+    if url:
+        return url
+    if os.environ.get("SSI_RELAY_URL"):
+        return os.environ["SSI_RELAY_URL"]
+    try:
+        with open("system_config.json", 'r') as f:
+            configured = json.load(f).get("relay_url")
+        if configured:
+            return configured
+    except (OSError, ValueError):
+        pass
+    return DEFAULT_RELAY_URL
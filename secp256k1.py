@@ -0,0 +1,160 @@
+import threading
+
+# --- SECP256K1 CURVE ARITHMETIC ---
+# The curve Ethereum (and therefore eth_account) keys live on:
+#     y^2 = x^3 + 7  over GF(P), base point G of prime order N.
+# Points are affine (x, y) tuples, None is the point at infinity. Internally
+# everything runs in Jacobian coordinates (X, Y, Z) so additions and
+# doublings need no field inversions.
+
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+WINDOW = 4
+
+def is_on_curve(point):
+    if point is None:
+        return False
+    x, y = point
+    return 0 <= x < P and 0 <= y < P and (y*y - x*x*x - 7) % P == 0
+
+def _to_jacobian(point):
+    return None if point is None else (point[0], point[1], 1)
+
+def _to_affine(jp):
+    if jp is None:
+        return None
+    x, y, z = jp
+    z_inv = pow(z, -1, P)
+    z_inv2 = z_inv * z_inv % P
+    return (x * z_inv2 % P, y * z_inv2 * z_inv % P)
+
+def _double(jp):
+    if jp is None:
+        return None
+    x, y, z = jp
+    if y == 0:
+        return None
+    a = x * x % P
+    b = y * y % P
+    c = b * b % P
+    d = 2 * ((x + b) * (x + b) - a - c) % P
+    e = 3 * a % P
+    x3 = (e * e - 2 * d) % P
+    y3 = (e * (d - x3) - 8 * c) % P
+    z3 = 2 * y * z % P
+    return (x3, y3, z3)
+
+def _add(jp, jq):
+    if jp is None:
+        return jq
+    if jq is None:
+        return jp
+    x1, y1, z1 = jp
+    x2, y2, z2 = jq
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s1 = y1 * z2 * z2z2 % P
+    s2 = y2 * z1 * z1z1 % P
+    if u1 == u2:
+        return _double(jp) if s1 == s2 else None
+    h = (u2 - u1) % P
+    r = (s2 - s1) % P
+    h2 = h * h % P
+    h3 = h * h2 % P
+    u1h2 = u1 * h2 % P
+    x3 = (r * r - h3 - 2 * u1h2) % P
+    y3 = (r * (u1h2 - x3) - s1 * h3) % P
+    z3 = h * z1 * z2 % P
+    return (x3, y3, z3)
+
+def _multiples(jp):
+    """[0*p, 1*p, ..., (2^WINDOW - 1)*p] in Jacobian form"""
+    row = [None, jp]
+    for _ in range((1 << WINDOW) - 2):
+        row.append(_add(row[-1], jp))
+    return row
+
+def point_add(p, q):
+    return _to_affine(_add(_to_jacobian(p), _to_jacobian(q)))
+
+def multi_mul(pairs):
+    """
+    sum(k_i * P_i) for many (scalar, point) pairs with ONE shared chain of
+    doublings (Straus' interleaved windows), like nizkp_lib.multi_exp.
+    """
+    pairs = [(k % N, point) for k, point in pairs if point is not None and k % N]
+    if not pairs:
+        return None
+
+    tables = [_multiples(_to_jacobian(point)) for _, point in pairs]
+    max_bits = max(k.bit_length() for k, _ in pairs)
+    mask = (1 << WINDOW) - 1
+    acc = None
+    for shift in range(((max_bits - 1) // WINDOW) * WINDOW, -1, -WINDOW):
+        for _ in range(WINDOW):
+            acc = _double(acc)
+        for (k, _), row in zip(pairs, tables):
+            digit = (k >> shift) & mask
+            if digit:
+                acc = _add(acc, row[digit])
+    return _to_affine(acc)
+
+def point_mul(k, point):
+    return multi_mul([(k, point)])
+
+# --- FIXED-BASE TABLE FOR G (same idea as fixed_base.py) ---
+# table[j][d] = d * 2^(WINDOW*j) * G, so k*G is one addition per window.
+_g_table = None
+_g_table_lock = threading.Lock()
+
+def _generator_table():
+    global _g_table
+    if _g_table is None:
+        with _g_table_lock:
+            if _g_table is None:
+                table = []
+                window_base = _to_jacobian(G)
+                for _ in range((N.bit_length() + WINDOW - 1) // WINDOW):
+                    row = _multiples(window_base)
+                    table.append([_to_jacobian(_to_affine(jp)) for jp in row])
+                    window_base = _add(row[-1], window_base)
+                _g_table = table
+    return _g_table
+
+def base_mul(k):
+    """k * G using the precomputed generator table"""
+    k %= N
+    mask = (1 << WINDOW) - 1
+    acc = None
+    for row in _generator_table():
+        if not k:
+            break
+        digit = k & mask
+        if digit:
+            acc = _add(acc, row[digit])
+        k >>= WINDOW
+    return _to_affine(acc)
+
+# --- SEC1 COMPRESSED ENCODING (33 bytes) ---
+
+def encode_point(point):
+    x, y = point
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, 'big')
+
+def decode_point(data):
+    if len(data) != 33 or data[0] not in (2, 3):
+        raise ValueError("Not a compressed secp256k1 point")
+    x = int.from_bytes(data[1:], 'big')
+    if x >= P:
+        raise ValueError("Point x-coordinate out of range")
+    y = pow((x * x * x + 7) % P, (P + 1) // 4, P) # P = 3 mod 4
+    if (y * y - x * x * x - 7) % P:
+        raise ValueError("Point is not on secp256k1")
+    if (y & 1) != data[0] - 2:
+        y = P - y
+    return (x, y)
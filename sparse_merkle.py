@@ -0,0 +1,157 @@
+import hashlib
+import json
+
+# --- SPARSE MERKLE TREE (keyed by DID) ---
+# A 256-level tree with one leaf slot per sha256(DID). Only non-empty nodes
+# are stored; everything else is a precomputed "empty subtree" hash. Setting
+# or clearing a DID rewrites exactly one leaf-to-root path, and the same
+# proof format proves membership (DID -> value) or non-membership (empty slot).
+#
+# The LG uses it as a revocation registry: a banned DID is inserted, its
+# root is anchored on chain with publishMerkleRoot under revocation_anchor(),
+# and the hospital allowlist (HBMT) never has to be rebuilt.
+
+DEPTH = 256
+EMPTY_LEAF = bytes(32)
+REVOCATION_REGISTRY = "revocation_registry.json" # Written by 9_lg_revocation.py
+
+def _hash_pair(left, right):
+    return hashlib.sha256(left + right).digest()
+
+# EMPTY_HASHES[l] = root of an empty subtree of height l
+EMPTY_HASHES = [EMPTY_LEAF]
+for _ in range(DEPTH):
+    EMPTY_HASHES.append(_hash_pair(EMPTY_HASHES[-1], EMPTY_HASHES[-1]))
+
+def did_key(did):
+    """Leaf position of a DID"""
+    return int.from_bytes(hashlib.sha256(did.encode('utf-8')).digest(), 'big')
+
+def leaf_hash(value):
+    return hashlib.sha256(value.encode('utf-8')).digest()
+
+def revocation_anchor(issuer_did):
+    """Name under which an issuer publishes its revocation root on chain"""
+    return f"{issuer_did}#revoked"
+
+class SparseMerkleTree:
+    def __init__(self):
+        self.nodes = {}  # (level, key >> level) -> digest, non-empty only
+        self.values = {} # did -> value, so the tree can be saved and reloaded
+
+    def _node(self, level, prefix):
+        return self.nodes.get((level, prefix), EMPTY_HASHES[level])
+
+    def get_root(self):
+        return self._node(DEPTH, 0).hex()
+
+    def set(self, did, value):
+        """Puts 'value' in the DID's slot. O(DEPTH) hashes."""
+        self.values[did] = value
+        self._write(did_key(did), leaf_hash(value))
+
+    def remove(self, did):
+        """Empties the DID's slot (e.g. a revocation is lifted)"""
+        self.values.pop(did, None)
+        self._write(did_key(did), EMPTY_LEAF)
+
+    def contains(self, did):
+        return did in self.values
+
+    def _write(self, key, digest):
+        self._store(0, key, digest)
+        for level in range(DEPTH):
+            prefix = key >> level
+            if prefix & 1:
+                parent = _hash_pair(self._node(level, prefix ^ 1), digest)
+            else:
+                parent = _hash_pair(digest, self._node(level, prefix ^ 1))
+            digest = parent
+            self._store(level + 1, prefix >> 1, digest)
+
+    def _store(self, level, prefix, digest):
+        # Keep the dict sparse: empty subtrees are implied
+        if digest == EMPTY_HASHES[level]:
+            self.nodes.pop((level, prefix), None)
+        else:
+            self.nodes[(level, prefix)] = digest
+
+    def get_proof(self, did):
+        """
+        Sibling path for the DID's slot. Empty siblings are not sent: the
+        bitmap marks which levels carry a real hash.
+        """
+        key = did_key(did)
+        bitmap = 0
+        siblings = []
+        for level in range(DEPTH):
+            sibling = self.nodes.get((level, (key >> level) ^ 1))
+            if sibling is not None:
+                bitmap |= 1 << level
+                siblings.append(sibling.hex())
+
+        return {"bitmap": format(bitmap, '064x'), "siblings": siblings}
+
+    # --- PERSISTENCE ---
+    # Only the DID -> value map is saved; a registry holds few entries, so
+    # rebuilding it costs len(values) * DEPTH hashes.
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({"root": self.get_root(), "values": self.values}, f, indent=4)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as f:
+            data = json.load(f)
+
+        tree = cls()
+        for did, value in data['values'].items():
+            tree.set(did, value)
+        if tree.get_root() != data['root']:
+            raise ValueError(f"{filename} is corrupt: rebuilt root does not match")
+        return tree
+
+def verify_not_revoked(did, proof, revoked_root):
+    """
+    Checks a non-membership proof against an issuer's anchored revocation
+    root. An issuer that never revoked anyone has no anchor (empty root).
+    """
+    if not revoked_root:
+        return True
+    return proof is not None and verify_sparse_proof(did, None, proof, revoked_root)
+
+def load_revocation_proof(did):
+    """Non-membership proof for 'did' from the LG's published registry, if any"""
+    try:
+        return SparseMerkleTree.load(REVOCATION_REGISTRY).get_proof(did)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def verify_sparse_proof(did, value, proof, root):
+    """
+    value=None  -> checks the DID's slot is EMPTY under 'root' (non-membership)
+    value=str   -> checks the DID's slot holds 'value'
+    """
+    try:
+        key = did_key(did)
+        bitmap = int(proof['bitmap'], 16)
+        siblings = iter(proof['siblings'])
+        digest = EMPTY_LEAF if value is None else leaf_hash(value)
+
+        for level in range(DEPTH):
+            if bitmap >> level & 1:
+                sibling = bytes.fromhex(next(siblings))
+            else:
+                sibling = EMPTY_HASHES[level]
+
+            if (key >> level) & 1:
+                digest = _hash_pair(sibling, digest)
+            else:
+                digest = _hash_pair(digest, sibling)
+
+        if next(siblings, None) is not None:
+            return False # Extra siblings: malformed proof
+        return digest.hex() == root
+    except (KeyError, TypeError, ValueError, StopIteration):
+        return False
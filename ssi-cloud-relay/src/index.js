@@ -11,6 +11,22 @@ export default {
   }
 };
 
+// Store-and-forward for offline DIDs: frames wait in a durable mailbox
+// (this.state.storage) bounded by size and age, and are flushed when the DID
+// registers. Each frame is its own value, "mbox:<did>:<seq>", so storing one
+// never rewrites the others (a CHUNK frame alone is ~256 KB); the per-DID
+// index "mboxidx:<did>" = {head, tail} says which seqs are live. Frames
+// carrying a msg_id get a DELIVERY receipt back to the sender (see
+// delivery.py for the statuses).
+const MAILBOX_SIZE = 256;
+// Same cap as MAX_BROADCAST_RECIPIENTS in delivery.py: clients split larger
+// broadcasts, and a frame over it is refused with a "dropped" receipt each.
+const MAX_BROADCAST_RECIPIENTS = 500;
+const MAILBOX_TTL_MS = 10 * 60 * 1000;
+
+const indexKey = (did) => `mboxidx:${did}`;
+const frameKey = (did, seq) => `mbox:${did}:${seq}`;
+
 // 2. The Durable Object (The "Room" where connections live)
 export class RelayHub {
   constructor(state, env) {
@@ -19,6 +35,142 @@ export class RelayHub {
     this.sessions = new Map();
   }
 
+  isOnline(did) {
+    const socket = this.sessions.get(did);
+    return socket && socket.readyState === 1; // 1 = OPEN
+  }
+
+  // DELIVERY frame back to the sender, if it asked (msg_id) and is online
+  receipt(entry, target, status) {
+    if (!entry.msg_id || !this.isOnline(entry.from)) return;
+    try {
+      this.sessions.get(entry.from).send(JSON.stringify({
+        type: "DELIVERY",
+        from: "relay",
+        to: entry.from,
+        payload: { msg_id: entry.msg_id, target: target, status: status }
+      }));
+    } catch (err) {
+      console.error(`[Cloud] Receipt to ${entry.from} failed:`, err);
+    }
+  }
+
+  async store(target, entry) {
+    const storage = this.state.storage;
+    const index = (await storage.get(indexKey(target))) || { head: 0, tail: 0 };
+    try {
+      await storage.put(frameKey(target, index.tail), entry);
+    } catch (err) {
+      // e.g. larger than a storage value allows: tell the sender instead of losing it quietly
+      console.error(`[Cloud] Could not store frame for ${target}:`, err);
+      this.receipt(entry, target, "dropped");
+      return false;
+    }
+    index.tail += 1;
+
+    if (index.tail - index.head > MAILBOX_SIZE) {
+      // Oldest frame makes room
+      const oldest = await storage.get(frameKey(target, index.head));
+      await storage.delete(frameKey(target, index.head));
+      index.head += 1;
+      if (oldest) this.receipt(oldest, target, "dropped");
+    }
+    await storage.put(indexKey(target), index);
+    this.receipt(entry, target, "stored");
+
+    // Wake up later to expire what nobody collected
+    if ((await storage.getAlarm()) === null) {
+      await storage.setAlarm(Date.now() + MAILBOX_TTL_MS);
+    }
+    return true;
+  }
+
+  async route(target, raw, data, msgId) {
+    const entry = { raw: raw, from: data.from, msg_id: msgId, queued_at: Date.now() };
+
+    if (this.isOnline(target)) {
+      try {
+        // Forward the message exactly as is
+        this.sessions.get(target).send(raw);
+        this.receipt(entry, target, "delivered");
+        console.log(`[Cloud] Relayed ${data.type} from ${data.from} to ${target}`);
+        return;
+      } catch (err) {
+        console.error(`[Cloud] Send to ${target} failed, storing:`, err);
+      }
+    }
+    // Keep it until the target registers (or the TTL passes)
+    if (await this.store(target, entry)) {
+      console.log(`[Cloud] Stored ${data.type} for offline ${target}`);
+    }
+  }
+
+  async flush(did) {
+    const storage = this.state.storage;
+    const index = await storage.get(indexKey(did));
+    if (!index) return;
+
+    // A frame leaves the mailbox only once it is sent (or expired), so a
+    // send failing halfway keeps the rest for the next registration
+    const now = Date.now();
+    let sent = 0;
+    while (index.head < index.tail) {
+      const key = frameKey(did, index.head);
+      const entry = await storage.get(key);
+      if (entry && now - entry.queued_at > MAILBOX_TTL_MS) {
+        this.receipt(entry, did, "expired");
+      } else if (entry) {
+        if (!this.isOnline(did)) break;
+        try {
+          this.sessions.get(did).send(entry.raw);
+        } catch (err) {
+          console.error(`[Cloud] Flush to ${did} failed:`, err);
+          break;
+        }
+        this.receipt(entry, did, "delivered");
+        sent += 1;
+      }
+      await storage.delete(key);
+      index.head += 1;
+      await storage.put(indexKey(did), index);
+    }
+
+    if (index.head >= index.tail) {
+      await storage.delete(indexKey(did));
+    }
+    console.log(`[Cloud] Flushed ${sent} stored message(s) to ${did}`);
+  }
+
+  // Periodic sweep of expired mailbox entries (oldest first in every mailbox)
+  async alarm() {
+    const storage = this.state.storage;
+    const now = Date.now();
+    let nextExpiry = null;
+    const indexes = await storage.list({ prefix: "mboxidx:" });
+    for (const [key, index] of indexes) {
+      const target = key.slice("mboxidx:".length);
+      while (index.head < index.tail) {
+        const entry = await storage.get(frameKey(target, index.head));
+        if (entry && now - entry.queued_at <= MAILBOX_TTL_MS) {
+          const expiry = entry.queued_at + MAILBOX_TTL_MS;
+          nextExpiry = nextExpiry === null ? expiry : Math.min(nextExpiry, expiry);
+          break;
+        }
+        if (entry) this.receipt(entry, target, "expired");
+        await storage.delete(frameKey(target, index.head));
+        index.head += 1;
+      }
+      if (index.head < index.tail) {
+        await storage.put(key, index);
+      } else {
+        await storage.delete(key);
+      }
+    }
+    if (nextExpiry !== null) {
+      await storage.setAlarm(nextExpiry);
+    }
+  }
+
   async fetch(request) {
     // Only allow WebSocket upgrades
     if (request.headers.get("Upgrade") !== "websocket") {
@@ -37,7 +189,8 @@ export class RelayHub {
 
   handleSession(webSocket) {
     webSocket.accept();
-    let myDID = null;
+    // One socket can carry many DIDs (mux_cloud_client.py)
+    const myDIDs = new Set();
 
     webSocket.addEventListener("message", async (msg) => {
       try {
@@ -45,24 +198,44 @@ export class RelayHub {
 
         // CASE 1: Registration (User says "I am DID X")
         if (data.type === "register") {
-          myDID = data.did;
-          this.sessions.set(myDID, webSocket);
-          console.log(`[Cloud] Registered: ${myDID}`);
+          myDIDs.add(data.did);
+          this.sessions.set(data.did, webSocket);
+          console.log(`[Cloud] Registered: ${data.did}`);
+          await this.flush(data.did);
           return;
         }
 
-        // CASE 2: Message Relay (User sends M1/M2)
-        if (data.to && data.payload) {
-          const targetSocket = this.sessions.get(data.to);
-          
-          if (targetSocket && targetSocket.readyState === 1) { // 1 = OPEN
-            // Forward the message exactly as is
-            targetSocket.send(JSON.stringify(data));
-            console.log(`[Cloud] Relayed ${data.type} from ${data.from} to ${data.to}`);
-          } else {
-            console.log(`[Cloud] Drop: Target ${data.to} not connected.`);
-            // Optional: Send error back to sender
+        if (data.type === "unregister") {
+          myDIDs.delete(data.did);
+          if (this.sessions.get(data.did) === webSocket) {
+            this.sessions.delete(data.did);
+          }
+          return;
+        }
+
+        // CASE 2: Broadcast (one frame, {target: msg_id} in "to_many")
+        if (data.to_many && typeof data.to_many === "object" && data.payload) {
+          const targets = Object.entries(data.to_many);
+          if (targets.length > MAX_BROADCAST_RECIPIENTS) {
+            console.warn(`[Cloud] Broadcast from ${data.from} refused: ${targets.length} recipients`);
+            for (const [target, msgId] of targets) {
+              this.receipt({ from: data.from, msg_id: msgId }, target, "dropped");
+            }
+            return;
           }
+          // Serialize the payload once and splice it into each recipient's frame
+          const body = JSON.stringify(data.payload);
+          for (const [target, msgId] of targets) {
+            const head = JSON.stringify({ type: data.type, from: data.from, to: target, msg_id: msgId });
+            await this.route(target, head.slice(0, -1) + ',"payload":' + body + "}", data, msgId);
+          }
+          console.log(`[Cloud] Broadcast ${data.type} from ${data.from} to ${targets.length} DIDs`);
+          return;
+        }
+
+        // CASE 3: Message Relay (User sends M1/M2)
+        if (data.to && data.payload) {
+          await this.route(data.to, msg.data, data, data.msg_id);
         }
       } catch (err) {
         console.error("[Cloud] Error parsing message:", err);
@@ -71,9 +244,11 @@ export class RelayHub {
 
     // Clean up on disconnect
     webSocket.addEventListener("close", () => {
-      if (myDID) {
-        this.sessions.delete(myDID);
-        console.log(`[Cloud] Disconnected: ${myDID}`);
+      for (const did of myDIDs) {
+        if (this.sessions.get(did) === webSocket) {
+          this.sessions.delete(did);
+          console.log(`[Cloud] Disconnected: ${did}`);
+        }
       }
     });
   }
@@ -1,11 +1,15 @@
 import json
+import threading
 import time
-import random
-from web3 import Web3
+from eth_account import Account
 from eth_account.messages import encode_defunct
+from eth_utils import keccak
+from nizkp_lib import ModpGroup, SECP256K1_GROUP
+from chain_cache import get_registry_cache, get_root_cache
+from tx_manager import get_sender
 
-# Connect to Ganache
-w3 = Web3(Web3.HTTPProvider("http://127.0.0.1:7545"))
+GANACHE_URL = "http://127.0.0.1:7545"
+CONFIG_FILE = "system_config.json"
 
 def load_json(filename):
     with open(filename, 'r') as f:
@@ -15,45 +19,211 @@ def save_json(filename, data):
     with open(filename, 'w') as f:
         json.dump(data, f, indent=4)
 
+# --- SHARED CHAIN CONTEXT ---
+# One per process, built on first use: the config is parsed once, Web3 is
+# imported and connected only when something actually talks to the chain,
+# every HTTP call reuses one keep-alive connection pool, and each contract
+# address gets a single contract instance.
+
+class SSIContext:
+    def __init__(self, provider_url=GANACHE_URL, config_file=CONFIG_FILE, pool_size=32):
+        self.provider_url = provider_url
+        self.config_file = config_file
+        self.pool_size = pool_size
+        self._config = None
+        self._w3 = None
+        self._session = None
+        self._contracts = {}
+        self._lock = threading.RLock()
+
+    @property
+    def config(self):
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = load_json(self.config_file)
+        return self._config
+
+    def reload_config(self):
+        """Forget the cached config and contracts (e.g. after 1_ga_setup.py redeploys)"""
+        with self._lock:
+            self._config = None
+            self._contracts = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def w3(self):
+        if self._w3 is None:
+            with self._lock:
+                if self._w3 is None:
+                    from web3 import Web3
+                    self._w3 = Web3(Web3.HTTPProvider(self.provider_url, session=self.session))
+        return self._w3
+
+    def batch_call(self, contract, calls):
+        """
+        Runs many view calls in ONE JSON-RPC round-trip (a batch of eth_call
+        requests, which Ganache/anvil/geth all accept). 'calls' is a list of
+        (function_name, args); returns the decoded results in the same order,
+        with None where a call failed.
+        """
+        if not calls:
+            return []
+        outputs = {item['name']: [o['type'] for o in item['outputs']]
+                   for item in contract.abi if item.get('type') == 'function'}
+        batch = [{
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "eth_call",
+            "params": [{"to": contract.address, "data": contract.encode_abi(name, args=list(args))}, "latest"]
+        } for i, (name, args) in enumerate(calls)]
+
+        response = self.session.post(self.provider_url, json=batch, timeout=30)
+        response.raise_for_status()
+        replies = {reply.get('id'): reply for reply in response.json()}
+
+        results = []
+        for i, (name, _) in enumerate(calls):
+            reply = replies.get(i, {})
+            if 'result' not in reply:
+                print(f"⚠️ Batched call {name} failed: {reply.get('error')}")
+                results.append(None)
+                continue
+            decoded = self.w3.codec.decode(outputs[name], bytes.fromhex(reply['result'][2:]))
+            results.append(decoded[0] if len(decoded) == 1 else list(decoded))
+        return results
+
+    def contract(self, address=None):
+        """Cached contract instance (defaults to the deployed registry)"""
+        address = address or self.config['contract_address']
+        contract = self._contracts.get(address)
+        if contract is None:
+            with self._lock:
+                contract = self._contracts.get(address)
+                if contract is None:
+                    contract = self.w3.eth.contract(address=address, abi=self.config['abi'])
+                    self._contracts[address] = contract
+        return contract
+
+_context = None
+_context_lock = threading.Lock()
+
+def context():
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = SSIContext()
+    return _context
+
+def warm_chain_caches(contract, addresses=(), issuer_dids=()):
+    """
+    Fetches the registry entries of 'addresses' and the roots of 'issuer_dids'
+    with one batched RPC and loads them into the shared caches, so verifying
+    a whole round afterwards needs no further chain reads.
+    """
+    addresses = list(dict.fromkeys(a for a in addresses if a))
+    issuer_dids = list(dict.fromkeys(d for d in issuer_dids if d))
+    registry = get_registry_cache(w3, contract)
+    roots = get_root_cache(w3, contract)
+    # Snapshot versions before the read: anything invalidated meanwhile is not cached
+    registry_versions = [registry.version(a) for a in addresses]
+    versions = [roots.version(did) for did in issuer_dids]
+
+    calls = [("registry", [a]) for a in addresses] + [("getMerkleRoot", [d]) for d in issuer_dids]
+    results = context().batch_call(contract, calls)
+
+    for address, version, user_data in zip(addresses, registry_versions, results):
+        if user_data is not None:
+            registry.put(address, user_data, version)
+    for issuer_did, version, root in zip(issuer_dids, versions, results[len(addresses):]):
+        if root is not None:
+            roots.put(issuer_did, root, version)
+
+class _LazyWeb3:
+    """Stands in for the module-level Web3 so 'from ssi_utils import w3' stays cheap"""
+    def __getattr__(self, name):
+        return getattr(context().w3, name)
+
+# Connect to Ganache (on first use)
+w3 = _LazyWeb3()
+
 def get_contract(address):
     try:
-        config = load_json("system_config.json")
-        return w3.eth.contract(address=address, abi=config['abi'])
+        return context().contract(address)
     except Exception as e:
         print(f"⚠️ Error loading contract ABI: {e}")
         return None
 
+# --- ZK GROUP BACKENDS ---
+# "modp" is the original 1024-bit safe-prime group (RFC 2409 Oakley group 2);
+# "secp256k1" reuses the curve the Ethereum account keys live on.
+ZK_GROUPS = {
+    "modp": ModpGroup(int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
+        "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+        "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
+        "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE65381"
+        "FFFFFFFFFFFFFFFF", 16
+    ), 2),
+    "secp256k1": SECP256K1_GROUP,
+}
+
+def configured_zk_group():
+    """Group selected by "zk_group" in system_config.json (default: modp)"""
+    try:
+        name = context().config.get("zk_group", "modp")
+    except (OSError, ValueError):
+        name = "modp"
+    return ZK_GROUPS[name]
+
 class SSIEntity:
-    def __init__(self, name, private_key_hex, contract_address=None):
+    def __init__(self, name, private_key_hex, contract_address=None, zk_group=None):
         self.name = name
         self.private_key_hex = private_key_hex
-        self.account = w3.eth.account.from_key(private_key_hex)
+        self.account = Account.from_key(private_key_hex)
         self.address = self.account.address
         self.did = f"did:eth:{self.address}"
         self.contract_address = contract_address
         
-        # --- ZKP SETUP (RFC 3526 - 2048-bit MODP Group) ---
-        self.zk_private_key = int(self.private_key_hex, 16)
-        self.G = 2 
-        self.P = int(
-            "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD1"
-            "29024E088A67CC74020BBEA63B139B22514A08798E3404DD"
-            "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245"
-            "E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
-            "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE65381"
-            "FFFFFFFFFFFFFFFF", 16
-        )
+        # --- ZKP SETUP (pluggable group, "zk_group" in system_config.json) ---
+        self.zk_group = ZK_GROUPS[zk_group] if zk_group else configured_zk_group()
         # Ensure key is within range
-        self.zk_private_key = self.zk_private_key % (self.P - 1)
-        self.zk_public_key = pow(self.G, self.zk_private_key, self.P)
+        self.zk_private_key = int(self.private_key_hex, 16) % self.zk_group.order
+        self.zk_public_key = self.zk_group.base_exp(self.zk_private_key)
+
+    def send_transaction(self, contract_function, gas=3000000):
+        """
+        Signs and sends a contract call with this entity's key using a locally
+        tracked nonce (see tx_manager.py). Returns a Future for the receipt.
+        """
+        return get_sender(w3, self.account).send(contract_function, gas=gas)
 
-    def register_on_blockchain(self):
-        """Registers DID and the ZK-Public Key on Ganache"""
+    def register_on_blockchain(self, wait=True):
+        """
+        Registers DID and the ZK-Public Key on Ganache. With wait=False the
+        receipt Future is returned instead, so many entities can register
+        back-to-back.
+        """
         if not self.contract_address:
             return
 
         contract = get_contract(self.contract_address)
-        pub_key_str = hex(self.zk_public_key)
+        pub_key_str = self.zk_group.encode(self.zk_public_key)
         
         try:
             # --- FIX: Check Registry Struct ---
@@ -61,21 +231,19 @@ class SSIEntity:
             user_data = contract.functions.registry(self.address).call()
             
             if user_data[2]: # 'exists' boolean is at index 2
-                print(f"[{self.name}] ✅ Already registered on chain.")
-                return
-
-            print(f"[{self.name}] Registering {self.did}...")
-            tx = contract.functions.register(self.did, pub_key_str).build_transaction({
-                'from': self.address,
-                'nonce': w3.eth.get_transaction_count(self.address),
-                'gas': 3000000,
-                'gasPrice': w3.to_wei('20', 'gwei')
-            })
-            signed_tx = w3.eth.account.sign_transaction(tx, self.account.key)
+                if user_data[0] == self.did and user_data[1] == pub_key_str:
+                    print(f"[{self.name}] ✅ Already registered on chain.")
+                    return
+                # e.g. "zk_group" changed: the chain still holds the old group's key
+                print(f"[{self.name}] 🔄 On-chain key is stale, re-registering {self.did}...")
+            else:
+                print(f"[{self.name}] Registering {self.did}...")
+            receipt = self.send_transaction(contract.functions.register(self.did, pub_key_str))
+            if not wait:
+                return receipt
             
             # Wait for transaction
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt.result()
             
             print(f"[{self.name}] ✅ Registered Public Key on Chain.")
         except Exception as e:
@@ -90,7 +258,7 @@ class SSIEntity:
         }
         msg_str = json.dumps(credential, sort_keys=True)
         signable_msg = encode_defunct(text=msg_str)
-        signed_msg = w3.eth.account.sign_message(signable_msg, private_key=self.private_key_hex)
+        signed_msg = Account.sign_message(signable_msg, private_key=self.private_key_hex)
         return { "payload": credential, "signature": signed_msg.signature.hex() }
 
     def verify_vc_issuer(self, vc_object):
@@ -100,57 +268,67 @@ class SSIEntity:
             issuer_did = payload['issuer']
             msg_str = json.dumps(payload, sort_keys=True)
             signable_msg = encode_defunct(text=msg_str)
-            recovered_address = w3.eth.account.recover_message(signable_msg, signature=signature)
+            recovered_address = Account.recover_message(signable_msg, signature=signature)
             return f"did:eth:{recovered_address}" == issuer_did
         except:
             return False
 
     def generate_zk_proof(self, challenge_str):
         """Generates Proof. RETURNS HEX STRINGS TO PREVENT JSON CORRUPTION."""
-        r = random.randint(1, self.P - 1)
-        t = pow(self.G, r, self.P)
+        group = self.zk_group
+        r = group.random_scalar()
+        t = group.base_exp(r)
         
-        challenge_int = int(Web3.keccak(text=challenge_str).hex(), 16)
-        c_input = f"{t}{self.zk_public_key}{challenge_int}"
-        c = int(Web3.keccak(text=c_input).hex(), 16) % (self.P - 1)
+        c = self._zk_challenge(t, self.zk_public_key, challenge_str)
         
-        s = (r + c * self.zk_private_key) % (self.P - 1)
+        s = (r + c * self.zk_private_key) % group.order
+        
+        return {"t": group.encode(t), "s": hex(s)}
+
+    def _fetch_zk_public_key(self, contract, prover_identifier):
+        """Reads the prover's ZK public key from the registry (None if unknown)"""
+        # --- FIX: LOGIC FOR NEW SECURE CONTRACT ---
+        target_address = prover_identifier
         
-        return {"t": hex(t), "s": hex(s)}
+        # If input is a DID, extract address (did:eth:0x123...)
+        if "did:eth:" in prover_identifier:
+            target_address = prover_identifier.split(":")[-1]
+
+        # 1. Fetch User Data from Registry Struct (cached, see chain_cache.py)
+        # Returns: (did, publicKey, exists)
+        user_data = get_registry_cache(w3, contract).get(target_address)
+        
+        if not user_data[2]: # Check 'exists' boolean
+            print(f" ⚠️ Identity {target_address} not found on chain.")
+            return None
+
+        # 2. Get Key from Struct (Index 1)
+        chain_pub_key_raw = user_data[1]
+        return self.zk_group.decode(chain_pub_key_raw)
+
+    def _zk_challenge(self, t, public_key, challenge_str):
+        group = self.zk_group
+        challenge_int = int.from_bytes(keccak(text=challenge_str), 'big')
+        c_input = f"{group.to_str(t)}{group.to_str(public_key)}{challenge_int}"
+        return int.from_bytes(keccak(text=c_input), 'big') % group.order
 
     def verify_zk_proof(self, prover_identifier, challenge_str, proof):
         """Verifies Proof. HANDLES HEX STRINGS."""
         contract = get_contract(self.contract_address)
         try:
-            # --- FIX: LOGIC FOR NEW SECURE CONTRACT ---
-            target_address = prover_identifier
-            
-            # If input is a DID, extract address (did:eth:0x123...)
-            if "did:eth:" in prover_identifier:
-                target_address = prover_identifier.split(":")[-1]
-
-            # 1. Fetch User Data from Registry Struct
-            # Returns: (did, publicKey, exists)
-            user_data = contract.functions.registry(target_address).call()
-            
-            if not user_data[2]: # Check 'exists' boolean
-                print(f" ⚠️ Identity {target_address} not found on chain.")
+            public_key = self._fetch_zk_public_key(contract, prover_identifier)
+            if public_key is None:
                 return False
-
-            # 2. Get Key from Struct (Index 1)
-            chain_pub_key_raw = user_data[1]
-            public_key = int(chain_pub_key_raw, 16)
             
             # 3. Verify Math
-            t = int(proof['t'], 16)
+            group = self.zk_group
+            t = group.decode(proof['t'])
             s = int(proof['s'], 16)
             
-            challenge_int = int(Web3.keccak(text=challenge_str).hex(), 16)
-            c_input = f"{t}{public_key}{challenge_int}"
-            c = int(Web3.keccak(text=c_input).hex(), 16) % (self.P - 1)
+            c = self._zk_challenge(t, public_key, challenge_str)
             
-            left = pow(self.G, s, self.P)
-            right = (t * pow(public_key, c, self.P)) % self.P
+            left = group.base_exp(s)
+            right = group.mul(t, group.exp(public_key, c))
             
             if left != right:
                 print(f"   ❌ Math Mismatch: Data corruption occurred.")
@@ -158,4 +336,36 @@ class SSIEntity:
             return left == right
         except Exception as e:
             print(f"   ⚠️ Math Error: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def verify_zk_batch(self, items):
+        """
+        Verifies many proofs with one batch check (see nizkp_lib.batch_check).
+        'items' is a list of (prover_identifier, challenge_str, proof);
+        returns one bool per item. If the batch fails, each proof is checked
+        on its own so only the offenders are rejected.
+        """
+        contract = get_contract(self.contract_address)
+        results = [False] * len(items)
+        equations = []
+        indices = []
+        for i, (prover_identifier, challenge_str, proof) in enumerate(items):
+            try:
+                public_key = self._fetch_zk_public_key(contract, prover_identifier)
+                if public_key is None:
+                    continue
+                t = self.zk_group.decode(proof['t'])
+                s = int(proof['s'], 16)
+                equations.append((t, s, public_key, self._zk_challenge(t, public_key, challenge_str)))
+                indices.append(i)
+            except Exception as e:
+                print(f"   ⚠️ Math Error: {e}")
+
+        if equations and self.zk_group.batch_check(equations):
+            for i in indices:
+                results[i] = True
+            return results
+
+        for i in indices:
+            results[i] = self.verify_zk_proof(*items[i])
+        return results
@@ -0,0 +1,106 @@
+import base64
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- BINARY WIRE FORMAT FOR MODEL WEIGHTS ---
+# M2 used to carry state_dict() as nested JSON lists: slow to build and
+# parse, and 3-5x bigger than the floats themselves. Instead every tensor is
+# packed into ONE little-endian buffer, described by a manifest:
+#
+#     {"format": "tensor-v1", "compression": "zstd" | None,
+#      "manifest": [{"name", "dtype", "shape", "offset", "nbytes"}, ...],
+#      "data": base64(buffer)}
+#
+# Decoding wraps that buffer with np.frombuffer / torch.from_numpy, so no
+# per-element conversion happens on the analyst side.
+
+FORMAT = "tensor-v1"
+
+# Wire dtypes (explicitly little-endian)
+WIRE_DTYPES = {
+    "float32": "<f4",
+    "float16": "<f2",
+    "int64": "<i8",
+}
+
+def is_encoded(weights):
+    return isinstance(weights, dict) and weights.get("format") == FORMAT
+
+def encode_weights(state_dict, dtype="float32", compress=False):
+    """
+    Packs a state_dict. Floating-point tensors are sent as 'dtype'
+    (float32, or float16 to halve the payload again); integer tensors keep
+    int64. compress=True uses zstd: opt-in, because the receiver then needs
+    the zstandard package too.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported wire dtype: {dtype}")
+    if compress and zstandard is None:
+        raise ValueError("zstd compression requested but 'zstandard' is not installed")
+
+    manifest = []
+    chunks = []
+    offset = 0
+    for name, tensor in state_dict.items():
+        array = tensor.detach().cpu().numpy() if hasattr(tensor, "detach") else np.asarray(tensor)
+        wire = dtype if np.issubdtype(array.dtype, np.floating) else "int64"
+        data = np.ascontiguousarray(array, dtype=WIRE_DTYPES[wire]).tobytes()
+        manifest.append({
+            "name": name,
+            "dtype": wire,
+            "shape": list(array.shape),
+            "offset": offset,
+            "nbytes": len(data)
+        })
+        chunks.append(data)
+        offset += len(data)
+
+    buffer = b"".join(chunks)
+    if compress:
+        buffer = zstandard.ZstdCompressor().compress(buffer)
+
+    return {
+        "format": FORMAT,
+        "compression": "zstd" if compress else None,
+        "manifest": manifest,
+        "data": base64.b64encode(buffer).decode('ascii')
+    }
+
+def decode_weights(weights, as_numpy=False):
+    """
+    name -> torch.Tensor (or np.ndarray with as_numpy=True). The tensors are
+    views over one decoded buffer. Old-style payloads (nested lists) are
+    still accepted.
+    """
+    if not is_encoded(weights):
+        if as_numpy:
+            return {k: np.asarray(v, dtype=np.float32) for k, v in weights.items()}
+        import torch
+        return {k: torch.tensor(v) for k, v in weights.items()}
+
+    buffer = base64.b64decode(weights["data"])
+    if weights.get("compression") == "zstd":
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but 'zstandard' is not installed")
+        buffer = zstandard.ZstdDecompressor().decompress(buffer)
+    elif weights.get("compression"):
+        raise ValueError(f"Unknown compression: {weights['compression']}")
+    buffer = bytearray(buffer) # Writable, so torch can share it without copying
+
+    arrays = {}
+    for entry in weights["manifest"]:
+        wire = np.dtype(WIRE_DTYPES[entry["dtype"]])
+        count = entry["nbytes"] // wire.itemsize
+        if entry["offset"] + entry["nbytes"] > len(buffer) or count != int(np.prod(entry["shape"])):
+            raise ValueError(f"Manifest does not match the data for {entry['name']}")
+        array = np.frombuffer(buffer, dtype=wire, count=count, offset=entry["offset"])
+        arrays[entry["name"]] = array.reshape(entry["shape"])
+
+    if as_numpy:
+        return arrays
+    import torch
+    return {name: torch.from_numpy(array) for name, array in arrays.items()}
@@ -0,0 +1,125 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from eth_account import Account
+
+# --- PIPELINED TRANSACTION SUBMISSION ---
+# Asking the node for the nonce and then blocking on the receipt costs two
+# RPC round-trips per write and serialises every account. Instead each
+# account keeps its next nonce locally, signs and sends back-to-back, and
+# receipts are collected on a thread pool. If the node rejects a nonce (or a
+# transaction never gets mined) the counter is resynced from the node's
+# pending count.
+
+DEFAULT_GAS = 3000000
+DEFAULT_GAS_PRICE_GWEI = 20
+RECEIPT_TIMEOUT = 120
+RECEIPT_WORKERS = 8
+
+_NONCE_ERRORS = ("nonce", "already known", "replacement transaction underpriced")
+
+class NonceManager:
+    """Next nonce for one account, tracked locally"""
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self.lock = threading.Lock()
+        self.nonce = None
+
+    def next(self):
+        with self.lock:
+            if self.nonce is None:
+                self.nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+    def resync(self):
+        """Re-read the pending nonce from the node (after a gap or rejection)"""
+        with self.lock:
+            self.nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+            print(f"⚠️ Nonce resynced for {self.address}: next = {self.nonce}")
+
+class TransactionSender:
+    """
+    Signs and sends contract calls for one account without waiting for them
+    to be mined. send() returns a Future that resolves to the receipt.
+    """
+    def __init__(self, w3, account):
+        self.w3 = w3
+        self.account = account
+        self.nonces = NonceManager(w3, account.address)
+        self._chain_id = None
+
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chain_id
+        return self._chain_id
+
+    def send(self, contract_function, gas=DEFAULT_GAS, gas_price_gwei=DEFAULT_GAS_PRICE_GWEI):
+        for attempt in range(2):
+            # Everything build_transaction would otherwise ask the node for
+            tx = contract_function.build_transaction({
+                'from': self.account.address,
+                'nonce': self.nonces.next(),
+                'gas': gas,
+                'gasPrice': self.w3.to_wei(gas_price_gwei, 'gwei'),
+                'chainId': self.chain_id
+            })
+            signed_tx = Account.sign_transaction(tx, self.account.key)
+            try:
+                tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                break
+            except Exception as e:
+                # The nonce we took was not used either way, so resync first
+                self.nonces.resync()
+                if attempt or not any(err in str(e).lower() for err in _NONCE_ERRORS):
+                    raise
+
+        try:
+            return _receipt_pool().submit(self._wait_for_receipt, tx_hash)
+        except RuntimeError:
+            # Interpreter is shutting down (e.g. an atexit flush): wait inline
+            future = Future()
+            future.set_result(self._wait_for_receipt(tx_hash))
+            return future
+
+    def _wait_for_receipt(self, tx_hash):
+        try:
+            return self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=RECEIPT_TIMEOUT)
+        except Exception:
+            # Dropped transaction: later nonces would be stuck behind the gap
+            self.nonces.resync()
+            raise
+
+def wait_all(futures):
+    """Receipts for a batch of send() futures, in order (None where it failed)"""
+    receipts = []
+    for future in futures:
+        try:
+            receipts.append(future.result())
+        except Exception as e:
+            print(f"⚠️ Transaction failed: {e}")
+            receipts.append(None)
+    return receipts
+
+_pool = None
+_senders = {}
+_shared_lock = threading.Lock()
+
+def _receipt_pool():
+    global _pool
+    if _pool is None:
+        with _shared_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=RECEIPT_WORKERS)
+    return _pool
+
+def get_sender(w3, account):
+    """One sender per account, so every SSIEntity with that key shares its nonces"""
+    with _shared_lock:
+        sender = _senders.get(account.address)
+        if sender is None:
+            sender = TransactionSender(w3, account)
+            _senders[account.address] = sender
+        return sender